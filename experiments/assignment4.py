@@ -52,12 +52,8 @@ def random_start_greedy_experiment(n, sol_size, D, lazy=False, seed=None):
 
 
 if __name__ == "__main__":
-    # To jit compile the functions
-    mini = tsp.TSP.from_csv("data/mini.csv")
-    start_sol, unselected = random_starting(len(mini), mini.solution_size, 0)
-    local_search_steepest_lazy(start_sol, unselected, mini.D)
-    start_sol, unselected = random_starting(len(mini), mini.solution_size, 0)
-    local_search_steepest(start_sol, unselected, mini.D, "intra_edge")
+    # To jit compile (or load from cache) the functions
+    tsp.warmup()
 
     with open("results/assignment4.csv", "w") as f:
         writer = csv.writer(f)
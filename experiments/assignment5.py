@@ -5,7 +5,7 @@ import typing
 import numpy as np
 from numba import njit, objmode
 
-from tsp import TSP, score
+from tsp import TSP, nearest_neighbors, score
 from tsp.localsearch import (
     local_search_greedy,
     local_search_steepest_candidate_edge,
@@ -33,9 +33,7 @@ def random_start_greedy_experiment(
     times = []
     iters = []
     n_neighbors = 10
-    closest_nodes = np.empty((200, n_neighbors), dtype=np.int64)
-    for i in range(200):
-        closest_nodes[i, :] = np.argsort(D[i])[:n_neighbors]
+    closest_nodes = nearest_neighbors(D, n_neighbors)
     for i in range(200):
         if starting == "random":
             start_sol, unselected = random_starting_from_starting(n, sol_size, i)
@@ -0,0 +1,67 @@
+"""Local search with and without don't-look bits
+
+Every variant is started from the same random solutions, we report the mean
+score and the mean time of a run. The full neighbourhood variants are only
+run without don't-look bits on TSPA/TSPB, on the synthetic 10k-node instances
+(matrix-free distances) a full scan per move is not feasible."""
+
+import time
+
+import numpy as np
+
+from tsp import TSP, warmup
+from tsp.localsearch import (
+    local_search_greedy,
+    local_search_steepest,
+    local_search_steepest_candidate_edge,
+)
+from tsp.utils import random_instance, random_starting
+
+RUNS = 10
+
+
+def variants(problem):
+    """(name, run, scans the full neighbourhood)"""
+    D = problem.D
+    closest_nodes = problem.candidates()
+    for intra_move in ["intra_edge", "intra_node"]:
+        yield f"steepest {intra_move}", lambda s, u, d, m=intra_move: (
+            local_search_steepest(s, u, D, m, dont_look=d)
+        ), True
+        yield f"greedy {intra_move}", lambda s, u, d, m=intra_move: (
+            local_search_greedy(s, u, D, m, dont_look=d)
+        ), True
+    yield "candidate edges", lambda s, u, d: local_search_steepest_candidate_edge(
+        s, u, D, closest_nodes, d
+    ), False
+
+
+def bench(name, problem, full_scan, runs=RUNS):
+    for variant, run, full_neighbourhood in variants(problem):
+        for dont_look in [False, True]:
+            if full_neighbourhood and not dont_look and not full_scan:
+                continue
+            scores, times = [], []
+            for seed in range(runs):
+                sol, unselected = random_starting(
+                    len(problem), problem.solution_size, seed
+                )
+                start = time.perf_counter()
+                sol = run(sol, unselected, dont_look)[0]
+                times.append(time.perf_counter() - start)
+                scores.append(problem.score(sol))
+            print(
+                f"{name:>8} {variant:>20} {str(dont_look):>10} "
+                f"{np.mean(scores):>12.1f} {np.mean(times):>10.4f}"
+            )
+
+
+if __name__ == "__main__":
+    warmup()
+    print(f"{'instance':>8} {'variant':>20} {'dont_look':>10} {'score':>12} {'time [s]':>10}")
+    for name in ["TSPA", "TSPB"]:
+        bench(name, TSP.from_csv(f"data/{name}.csv"), True)
+    for seed in range(2):
+        points, weights = random_instance(10_000, seed)
+        problem = TSP(points, weights, representation="coordinates")
+        bench(f"10k-{seed}", problem, False, runs=2)
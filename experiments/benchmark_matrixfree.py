@@ -0,0 +1,52 @@
+"""Dense D against the matrix-free CoordinateMatrix
+
+For every size we report the time and memory needed to build the problem
+and the time of a single full steepest descent step (all intra-edge and
+inter-node moves evaluated), which is dominated by accesses to D."""
+
+import time
+
+import numpy as np
+
+from tsp import TSP
+from tsp.localsearch.descent import steepest_descent
+from tsp.utils import random_instance, random_starting
+
+SIZES = [500, 1000, 2000, 5000, 10000]
+
+
+def bench(points, weights, representation, dtype=np.float64):
+    start = time.perf_counter()
+    problem = TSP(points, weights, dtype, representation=representation)
+    build = time.perf_counter() - start
+    memory = problem.D.nbytes if representation == "dense" else 0
+
+    sol, unselected = random_starting(len(problem), problem.solution_size, seed=0)
+    start = time.perf_counter()
+    steepest_descent(sol, unselected, problem.D, "intra_edge")
+    step = time.perf_counter() - start
+    return build, memory, step
+
+
+if __name__ == "__main__":
+    # compile every specialization on a small instance first
+    points, weights = random_instance(20)
+    for representation, dtype in [
+        ("dense", np.float64),
+        ("dense", np.int32),
+        ("coordinates", np.float64),
+    ]:
+        bench(points, weights, representation, dtype)
+
+    print(f"{'n':>6} {'representation':>16} {'build [s]':>10} {'D [MB]':>8} {'step [s]':>9}")
+    for n in SIZES:
+        points, weights = random_instance(n)
+        for name, representation, dtype in [
+            ("dense float64", "dense", np.float64),
+            ("dense int32", "dense", np.int32),
+            ("coordinates", "coordinates", np.float64),
+        ]:
+            build, memory, step = bench(points, weights, representation, dtype)
+            print(
+                f"{n:>6} {name:>16} {build:>10.3f} {memory / 2**20:>8.1f} {step:>9.3f}"
+            )
@@ -0,0 +1,48 @@
+"""Serial against parallel steepest descent
+
+For every size we time a few steepest descent steps (all intra-edge and
+inter-node moves evaluated) from the same random solution, once with
+steepest_descent and once with steepest_descent_parallel, and report the
+speedup on numba's threads. The largest instance uses the matrix-free
+CoordinateMatrix, its dense D would not fit in memory."""
+
+import time
+
+import numba
+
+from tsp import TSP
+from tsp.localsearch.descent import steepest_descent, steepest_descent_parallel
+from tsp.utils import random_instance, random_starting
+
+SIZES = [(200, "dense"), (2000, "dense"), (20000, "coordinates")]
+STEPS = 3
+
+
+def bench(problem, step):
+    sol, unselected = random_starting(len(problem), problem.solution_size, seed=0)
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        step(sol, unselected, problem.D, "intra_edge")
+    return (time.perf_counter() - start) / STEPS
+
+
+if __name__ == "__main__":
+    # compile every specialization on a small instance first
+    for representation in ["dense", "coordinates"]:
+        problem = TSP(*random_instance(20), representation=representation)
+        bench(problem, steepest_descent)
+        bench(problem, steepest_descent_parallel)
+
+    print(f"threads: {numba.get_num_threads()}")
+    print(
+        f"{'n':>6} {'representation':>15} {'serial [s]':>11}"
+        f" {'parallel [s]':>13} {'speedup':>8}"
+    )
+    for n, representation in SIZES:
+        problem = TSP(*random_instance(n), representation=representation)
+        serial = bench(problem, steepest_descent)
+        parallel = bench(problem, steepest_descent_parallel)
+        print(
+            f"{n:>6} {representation:>15} {serial:>11.4f} {parallel:>13.4f}"
+            f" {serial / parallel:>8.2f}"
+        )
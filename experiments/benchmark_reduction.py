@@ -0,0 +1,53 @@
+"""Local search on reduced instances
+
+Every instance is reduced to the given fraction of nodes with the smallest
+insertion lower bounds (TSP.reduce), then steepest local search is run from
+the same number of random solutions on the reduced D. The solutions are
+mapped back to the original instance, we report the mean time of a run, the
+mean and the best score. For TSPA/TSPB we also report how many nodes are
+provably excluded given the best weighted regret greedy cycle."""
+
+import time
+
+import numpy as np
+
+from tsp import TSP, warmup
+from tsp.localsearch import local_search_steepest
+from tsp.solvers import solve_all_starts
+from tsp.utils import random_starting
+
+RUNS = 20
+KEEP = [None, 0.9, 0.8, 0.7]
+
+
+def bench(problem, keep):
+    reduced = problem if keep is None else problem.reduce(keep=keep)
+    times, scores = [], []
+    for seed in range(RUNS):
+        sol, unselected = random_starting(len(reduced), reduced.solution_size, seed)
+        start = time.perf_counter()
+        sol = local_search_steepest(
+            sol, unselected, reduced.D, "intra_edge", cached=True
+        )[0]
+        times.append(time.perf_counter() - start)
+        scores.append(problem.score(reduced.original(sol)))
+    return len(reduced), np.mean(times), np.mean(scores), np.min(scores)
+
+
+if __name__ == "__main__":
+    warmup()
+    print(
+        f"{'instance':>9} {'keep':>5} {'nodes':>6} {'time [s]':>9}"
+        f" {'mean':>9} {'best':>9}"
+    )
+    for name in ["TSPA", "TSPB"]:
+        problem = TSP.from_csv(f"data/{name}.csv")
+        _, greedy = solve_all_starts(problem, "weighted_regret")
+        provable = problem.reduce(upper_bound=greedy.min())
+        print(f"{name}: {len(problem) - len(provable)} nodes provably excluded")
+        for keep in KEEP:
+            nodes, seconds, mean, best = bench(problem, keep)
+            print(
+                f"{name:>9} {keep or 1.0:>5} {nodes:>6} {seconds:>9.4f}"
+                f" {mean:>9.1f} {best:>9.1f}"
+            )
@@ -0,0 +1,50 @@
+"""Process start-up cost: import, first local search and tsp.warmup()
+
+Every measurement runs in a fresh interpreter. The cold run uses an empty
+NUMBA_CACHE_DIR, so everything is compiled, the warm run reuses the on-disk
+cache written by the cold one."""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+FIRST_RESULT = """
+import time
+start = time.perf_counter()
+import tsp
+imported = time.perf_counter()
+from tsp.localsearch import local_search_steepest
+from tsp.utils import random_starting
+problem = tsp.TSP.from_csv("data/TSPA.csv", cache=False)
+sol, unselected = random_starting(len(problem), problem.solution_size, seed=0)
+local_search_steepest(sol, unselected, problem.D, "intra_edge")
+end = time.perf_counter()
+print(imported - start, end - start)
+"""
+
+WARMUP = """
+import time
+start = time.perf_counter()
+import tsp
+tsp.warmup()
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, cache_dir):
+    env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir)
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, check=True
+    )
+    return [float(x) for x in out.stdout.split()]
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for state in ["cold", "warm"]:
+            imported, first = run(FIRST_RESULT, cache_dir)
+            print(f"{state}: import tsp {imported:.3f} s, first local search {first:.3f} s")
+        for state in ["cold", "warm"]:
+            (warmup,) = run(WARMUP, cache_dir)
+            print(f"{state}: tsp.warmup() {warmup:.3f} s")
@@ -0,0 +1,48 @@
+"""Array tour against the two-level list tour
+
+The candidate-edge search with don't-look bits is run on synthetic instances
+(matrix-free distances) of growing size, with the tour in an array, where a
+2-opt move reverses O(n) entries, and in a two-level list, where it costs
+O(sqrt(n)). The lazy search is compared on smaller instances, its first full
+evaluation is quadratic."""
+
+import time
+
+from tsp import TSP, warmup
+from tsp.localsearch import local_search_steepest_candidate_edge
+from tsp.localsearch.lazy import local_search_steepest_lazy
+from tsp.utils import random_instance, random_starting
+
+CANDIDATE_SIZES = [5_000, 20_000, 50_000]
+LAZY_SIZES = [500, 1_000, 2_000]
+
+
+def bench(problem, run):
+    sol, unselected = random_starting(len(problem), problem.solution_size, seed=0)
+    start = time.perf_counter()
+    sol = run(sol, unselected)[0]
+    return problem.score(sol), time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    warmup()
+    print(f"{'n':>7} {'search':>10} {'tour':>10} {'score':>12} {'time [s]':>9}")
+    for n in CANDIDATE_SIZES:
+        problem = TSP(*random_instance(n), representation="coordinates")
+        closest_nodes = problem.candidates()
+        for name, two_level in [("array", False), ("two-level", True)]:
+            score, elapsed = bench(
+                problem,
+                lambda s, u: local_search_steepest_candidate_edge(
+                    s, u, problem.D, closest_nodes, True, two_level
+                ),
+            )
+            print(f"{n:>7} {'candidate':>10} {name:>10} {score:>12.0f} {elapsed:>9.3f}")
+    for n in LAZY_SIZES:
+        problem = TSP(*random_instance(n))
+        for name, two_level in [("array", False), ("two-level", True)]:
+            score, elapsed = bench(
+                problem,
+                lambda s, u: local_search_steepest_lazy(s, u, problem.D, two_level),
+            )
+            print(f"{n:>7} {'lazy':>10} {name:>10} {score:>12.0f} {elapsed:>9.3f}")
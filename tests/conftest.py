@@ -0,0 +1,13 @@
+import pytest
+
+from tsp import TSP
+
+
+@pytest.fixture(scope="module")
+def tspa():
+    return TSP.from_csv("data/TSPA.csv", cache=False)
+
+
+@pytest.fixture(scope="module")
+def tspb():
+    return TSP.from_csv("data/TSPB.csv", cache=False)
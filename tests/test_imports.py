@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+HEAVY = ["matplotlib", "tqdm", "pandas", "scipy", "IPython"]
+
+
+def test_import_is_lean():
+    code = (
+        "import sys\n"
+        "import tsp, tsp.localsearch, tsp.localsearch.lazy\n"
+        "import tsp.solvers, tsp.evolutionary, tsp.largescale\n"
+        f"print([m for m in {HEAVY!r} if m in sys.modules])\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "[]"
@@ -1,25 +1,98 @@
+import heapq
+import subprocess
+import sys
+
 import numpy as np
 
-from tsp.localsearch.lazy import NULL, array_map, get_edge_matrix
-
-
-def test_get_edge_matrix():
-    sol = [0, 1, 2]
-    res = get_edge_matrix(sol, 4)
-    assert np.all(
-        res
-        == np.array(
-            [
-                [NULL, 0, NULL, NULL],
-                [NULL, NULL, 1, NULL],
-                [2, NULL, NULL, NULL],
-                [NULL, NULL, NULL, NULL],
-            ]
-        )
-    )
+from tsp.localsearch.heap import (
+    PUSHES,
+    SIZE,
+    heap_compact,
+    heap_pop,
+    heap_push,
+    heap_reserve,
+    move_heap,
+)
+from tsp.localsearch.lazy import (
+    NULL,
+    array_map,
+    get_successors,
+    local_search_steepest_lazy,
+)
+from tsp.utils import random_starting
+
+
+def test_get_successors():
+    sol = np.array([0, 1, 2])
+    res = get_successors(sol, 4)
+    assert np.all(res == np.array([1, 2, 0, NULL]))
 
 
 def test_array_map():
     unselected = np.array([2, 5, 1])
     res = array_map(unselected, 6)
     assert np.all(res == np.array([NULL, 2, 0, NULL, NULL, 1]))
+
+
+def test_move_heap_order():
+    rng = np.random.default_rng(0)
+    heap = move_heap(4)
+    expected = []
+    for _ in range(100):
+        key = float(rng.integers(-5, 0))
+        move = tuple(int(x) for x in rng.integers(0, 3, size=5))
+        heap = heap_reserve(heap, 1)
+        heap_push(heap, key, *move)
+        heapq.heappush(expected, (key, move))
+    assert heap[2][PUSHES] == 100
+    while expected:
+        assert heap_pop(heap) == heapq.heappop(expected)
+    assert heap[2][SIZE] == 0
+
+
+def test_move_heap_compact():
+    heap = move_heap(8)
+    for key in range(8):
+        heap_push(heap, -float(key), 1, key, 0, 0, 0)
+    heap_compact(heap, heap[1][: heap[2][SIZE], 1] % 2 == 0)
+    keys = [heap_pop(heap)[0] for _ in range(heap[2][SIZE])]
+    assert keys == [-6.0, -4.0, -2.0, 0.0]
+
+
+def test_lazy_stats(tspa):
+    instance = tspa
+    sol, unselected = random_starting(len(instance), instance.solution_size, seed=0)
+    stats = np.zeros(6, dtype=np.int64)
+    _, num_iterations, _ = local_search_steepest_lazy(
+        sol, unselected, instance.D, False, stats
+    )
+    size, pushes, pops, stale_pops, _, peak_size = stats
+    assert size == 0 and pushes == pops == num_iterations
+    assert 0 < stale_pops < pops and peak_size <= pushes
+
+
+def test_initial_evaluation_memory_is_linear():
+    # a fresh process, so the peak RSS is that of the evaluation; one
+    # n_sol x n_sol float64 array would add 32 MB
+    code = (
+        "import resource\n"
+        "import numpy as np\n"
+        "from tsp import TSP\n"
+        "from tsp.localsearch.lazy import evaluate_all_moves\n"
+        "from tsp.solvers import solve_nn_first\n"
+        "rng = np.random.default_rng(0)\n"
+        "points = rng.integers(0, 4000, size=(4000, 2)).astype(np.float64)\n"
+        "weights = rng.integers(100, 2000, size=4000).astype(np.float64)\n"
+        "D = TSP(points, weights, representation='coordinates').D\n"
+        "sol = solve_nn_first(D, 0, 2000)\n"
+        "unselected = np.setdiff1d(np.arange(4000), sol)\n"
+        "evaluate_all_moves(sol[:10], unselected[:10], D)\n"
+        "before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "evaluate_all_moves(sol, unselected, D)\n"
+        "after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "print((after - before) // 1024)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert int(out.stdout) < 16
@@ -2,14 +2,27 @@ import numpy as np
 import pytest
 
 from tsp import TSP
+from tsp.localsearch import (
+    local_search_greedy,
+    local_search_steepest,
+    local_search_steepest_candidate_edge,
+)
+from tsp.localsearch.insertion import (
+    best_insertion,
+    insertion_table,
+    update_insertion_table,
+)
 from tsp.localsearch.moves import (
     inter_node_exchange,
     inter_node_exchange_delta,
+    inter_node_exchange_delta_matrix,
     intra_edge_exchange,
     intra_edge_exchange_delta,
+    intra_edge_exchange_delta_matrix,
     intra_node_exchange,
     intra_node_exchange_delta,
 )
+from tsp.utils import random_starting
 
 
 @pytest.fixture
@@ -104,3 +117,125 @@ def test_inter_node_beginning(instance):
 
     score_after = instance.score(solution)
     assert delta == score_after - score_before
+
+
+def test_delta_matrices(instance):
+    solution = np.array([0, 1, 3, 5])
+    unselected_nodes = np.array([4, 2])
+    intra = intra_edge_exchange_delta_matrix(instance.D, solution)
+    inter = inter_node_exchange_delta_matrix(instance.D, solution, unselected_nodes)
+    for i in range(len(solution)):
+        for j in range(len(solution)):
+            if (j - i) % len(solution) in (0, 1, len(solution) - 1):
+                assert intra[i, j] == np.inf
+            else:
+                assert intra[i, j] == intra_edge_exchange_delta(
+                    instance.D, solution, i, j
+                )
+        for k in range(len(unselected_nodes)):
+            assert inter[i, k] == inter_node_exchange_delta(
+                instance.D, solution, i, unselected_nodes, k
+            )
+
+
+@pytest.mark.parametrize("intra_move", ["intra_edge", "intra_node"])
+def test_cached_steepest_same_local_optimum(intra_move, tspa):
+    problem = tspa
+    for seed in range(3):
+        sol, unselected = random_starting(len(problem), problem.solution_size, seed)
+        expected, expected_iterations, _ = local_search_steepest(
+            sol.copy(), unselected.copy(), problem.D, intra_move
+        )
+        result, iterations, _ = local_search_steepest(
+            sol, unselected, problem.D, intra_move, cached=True
+        )
+        assert (result == expected).all()
+        assert iterations == expected_iterations
+
+
+def test_insertion_table(tspa):
+    problem = tspa
+    sol, unselected = random_starting(len(problem), problem.solution_size, 0)
+    table = insertion_table(problem.D, sol, unselected)
+    for _ in range(5):
+        inter = inter_node_exchange_delta_matrix(problem.D, sol, unselected)
+        best, position, _, _, _, active = table
+        for k in range(len(unselected)):
+            column = np.minimum(inter[:, k], 0.0)
+            if not active[k]:
+                assert column.min() == 0.0
+            elif position[k] == -1:
+                assert best[k] <= column.min()
+            else:
+                assert best[k] == column.min()
+                assert position[k] == np.argmin(column)
+
+        delta, i, k, _ = best_insertion(table, problem.D, sol, unselected, 0.0)
+        assert delta == inter.min()
+        assert (i, k) == np.unravel_index(np.argmin(inter), inter.shape)
+        entered = unselected[k]
+        inter_node_exchange(sol, i, unselected, k)
+        dirty = np.zeros(len(sol), dtype=np.bool_)
+        dirty[[i - 1, i, (i + 1) % len(sol)]] = True
+        update_insertion_table(table, problem.D, sol, unselected, dirty, entered, k)
+
+
+@pytest.mark.parametrize("intra_move", ["intra_edge", "intra_node"])
+def test_parallel_steepest_same_local_optimum(intra_move, tspb):
+    problem = tspb
+    sol, unselected = random_starting(len(problem), problem.solution_size, 0)
+    expected = local_search_steepest(
+        sol.copy(), unselected.copy(), problem.D, intra_move
+    )
+    result = local_search_steepest(
+        sol, unselected, problem.D, intra_move, parallel=True
+    )
+    assert (result[0] == expected[0]).all()
+    assert result[1:] == expected[1:]
+
+
+def test_conflicting_engines(tspa):
+    problem = tspa
+    sol, unselected = random_starting(len(problem), problem.solution_size, 0)
+    for flags in [
+        {"cached": True, "dont_look": True},
+        {"cached": True, "parallel": True},
+        {"dont_look": True, "parallel": True},
+    ]:
+        with pytest.raises(ValueError):
+            local_search_steepest(sol, unselected, problem.D, "intra_edge", **flags)
+
+
+def test_dont_look_bits(tspb):
+    problem = tspb
+    closest_nodes = problem.candidates()
+    runs = [
+        lambda s, u: local_search_steepest(
+            s, u, problem.D, "intra_edge", dont_look=True
+        ),
+        lambda s, u: local_search_steepest(
+            s, u, problem.D, "intra_node", dont_look=True
+        ),
+        lambda s, u: local_search_greedy(
+            s, u, problem.D, "intra_edge", dont_look=True
+        ),
+        lambda s, u: local_search_steepest_candidate_edge(
+            s, u, problem.D, closest_nodes, dont_look=True
+        ),
+        lambda s, u: local_search_steepest_candidate_edge(
+            s, u, problem.D, closest_nodes, two_level=True
+        ),
+    ]
+    for run in runs:
+        sol, unselected = random_starting(len(problem), problem.solution_size, 0)
+        before = problem.score(sol)
+        result = run(sol, unselected)[0]
+        assert sorted(np.concatenate([result, unselected])) == list(range(len(problem)))
+        assert problem.score(result) < before
+
+        # every node selected, no inter-route moves
+        sol, unselected = random_starting(len(problem), len(problem), 0)
+        before = problem.score(sol)
+        result = run(sol, unselected)[0]
+        assert sorted(result) == list(range(len(problem)))
+        assert problem.score(result) < before
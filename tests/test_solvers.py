@@ -0,0 +1,132 @@
+import typing
+
+import numpy as np
+import pytest
+
+from tsp.solvers import (
+    Constructor,
+    link_after,
+    link_first,
+    linked_to_array,
+    solve_all_starts,
+    solve_greedy_cycle,
+    solve_nn_any,
+    solve_nn_first,
+    solve_regret_greedy_cycle,
+    solve_weighted_regret_greedy_cycle,
+)
+
+
+@pytest.fixture(scope="module")
+def problem(tspb):
+    return tspb
+
+
+def greedy_cycle_full_scan(D, starting, solution_size):
+    """Greedy cycle evaluating every (edge, node) pair on every step"""
+    solution = [starting]
+    visited = {starting}
+    for _ in range(solution_size - 1):
+        best_i, best_node, best_delta = -1, -1, np.inf
+        for i in range(len(solution)):
+            first, second = solution[i], solution[(i + 1) % len(solution)]
+            for node in range(len(D)):
+                if node in visited:
+                    continue
+                delta = D[first, node] + D[node, second] - D[first, second]
+                if delta < best_delta:
+                    best_i, best_node, best_delta = i, node, delta
+        solution.insert(best_i + 1, best_node)
+        visited.add(best_node)
+    return np.array(solution)
+
+
+@pytest.mark.parametrize("starting", [0, 57, 199])
+def test_greedy_cycle_matches_full_scan(problem, starting):
+    expected = greedy_cycle_full_scan(problem.D, starting, 40)
+    assert np.all(solve_greedy_cycle(problem.D, starting, 40) == expected)
+
+
+def regret_full_scan(D, starting, solution_size, weighted):
+    """2-regret insertion sorting the deltas of every edge for every node,
+    ties in delta are broken by the position of the edge"""
+    solution = list(starting)
+    visited = set(solution)
+    while len(solution) < solution_size:
+        best_i, best_node, best_score = -1, -1, np.inf
+        for node in range(len(D)):
+            if node in visited:
+                continue
+            bests = []
+            for i in range(len(solution)):
+                first, second = solution[i], solution[(i + 1) % len(solution)]
+                bests.append((D[first, node] + D[node, second] - D[first, second], i))
+            if len(bests) == 1:
+                best_node = node
+                continue
+            bests.sort()
+            regret = bests[0][0] - bests[1][0]
+            score = 0.5 * regret + 0.5 * bests[0][0] if weighted else regret
+            if score < best_score:
+                best_i, best_node, best_score = bests[0][1], node, score
+        solution.insert(best_i + 1, best_node)
+        visited.add(best_node)
+    return np.array(solution)
+
+
+@pytest.mark.parametrize("starting", [3, 120])
+def test_regret_matches_full_scan(problem, starting):
+    expected = regret_full_scan(problem.D, [starting], 40, False)
+    assert np.all(solve_regret_greedy_cycle(problem.D, starting, 40) == expected)
+
+
+@pytest.mark.parametrize("starting", [[8], [8, 150, 33]])
+def test_weighted_regret_matches_full_scan(problem, starting):
+    expected = regret_full_scan(problem.D, starting, 40, True)
+    result = solve_weighted_regret_greedy_cycle(problem.D, np.array(starting), 40)
+    assert np.all(result == expected)
+
+
+def test_linked_cycle_keeps_order_labels():
+    n = 100
+    succ = np.empty(n, dtype=np.int64)
+    label = np.empty(n, dtype=np.int64)
+    link_first(succ, label, 0)
+    expected = [0]
+    # always inserting right after the head exhausts the label gap and relabels
+    for node in range(1, n):
+        link_after(succ, label, 0, 0, node)
+        expected.insert(1, node)
+
+    solution = linked_to_array(succ, 0, n)
+    assert np.all(solution == expected)
+    assert np.all(np.diff(label[solution]) > 0)
+
+
+@pytest.mark.parametrize("solve", [solve_nn_first, solve_nn_any])
+def test_nn_with_candidates(problem, solve):
+    for starting in [0, 42, 199]:
+        expected = solve(problem.D, starting, problem.solution_size)
+        result = solve(
+            problem.D, starting, problem.solution_size, problem.candidates(5)
+        )
+        assert np.all(result == expected)
+
+
+@pytest.mark.parametrize("constructor", typing.get_args(Constructor))
+def test_solve_all_starts(problem, constructor):
+    starts = [5, 0, 77, 199]
+    tours, scores = solve_all_starts(problem, constructor, starts)
+    solve = {
+        "nn_first": solve_nn_first,
+        "nn_any": solve_nn_any,
+        "greedy_cycle": solve_greedy_cycle,
+        "regret": solve_regret_greedy_cycle,
+        "weighted_regret": lambda D, s, size: solve_weighted_regret_greedy_cycle(
+            D, np.array([s]), size
+        ),
+    }[constructor]
+    assert tours.shape == (len(starts), problem.solution_size)
+    for tour, score, starting in zip(tours, scores, starts):
+        assert np.all(tour == solve(problem.D, starting, problem.solution_size))
+        assert score == problem.score(tour)
@@ -0,0 +1,182 @@
+import numpy as np
+import pytest
+
+import tsp.cache
+from tsp import TSP, distance_matrix, score_many
+from tsp.localsearch import local_search_steepest
+from tsp.localsearch.moves import inter_node_exchange_delta, intra_edge_exchange_delta
+from tsp.packed import inter_node_exchange_delta as packed_inter_node_delta
+from tsp.packed import intra_edge_exchange_delta as packed_intra_edge_delta
+from tsp.reduction import insertion_lower_bounds
+from tsp.solvers import (
+    GreedyCycle,
+    solve_all_starts,
+    solve_greedy_cycle,
+    solve_nn_any,
+    solve_nn_first,
+)
+from tsp.utils import random_starting
+
+
+def test_distance_matrix_blocks():
+    rng = np.random.default_rng(0)
+    points = rng.integers(0, 1000, size=(50, 2)).astype(np.float64)
+    weights = rng.integers(0, 500, size=50).astype(np.float64)
+
+    diffs = points[:, np.newaxis, :] - points[np.newaxis, :, :]
+    expected = np.floor(np.sqrt(np.sum(diffs**2, axis=-1)) + 0.5) + weights
+
+    assert np.all(distance_matrix(points, weights, block_size=7) == expected)
+    D = distance_matrix(points, weights, dtype=np.int32, block_size=64)
+    assert D.dtype == np.int32
+    assert np.all(D == expected)
+
+
+def test_int32_local_search(tspa):
+    problem = tspa
+    compact = TSP(problem._points, problem._weights, dtype=np.int32)
+
+    sol, unselected = random_starting(len(problem), problem.solution_size, seed=3)
+    expected, _, _ = local_search_steepest(
+        sol.copy(), unselected.copy(), problem.D, "intra_edge"
+    )
+    result, _, _ = local_search_steepest(sol, unselected, compact.D, "intra_edge")
+    assert np.all(result == expected)
+    assert compact.score(result) == problem.score(expected)
+
+
+def test_packed_representation(tspb):
+    dense = tspb
+    packed = TSP(dense._points, dense._weights, representation="packed")
+    assert dense.P is None
+    assert len(packed.P) == len(dense) * (len(dense) - 1) // 2
+
+    sol, unselected = random_starting(len(dense), dense.solution_size, seed=5)
+    assert packed.score(sol) == dense.score(sol)
+    for i, j in [(0, 5), (7, 2), (3, 3), (len(sol) - 1, 0)]:
+        assert packed_intra_edge_delta(
+            packed.P, packed._weights, sol, i, j
+        ) == intra_edge_exchange_delta(dense.D, sol, i, j)
+    for i, k in [(0, 0), (4, 9), (len(sol) - 1, len(unselected) - 1)]:
+        assert packed_inter_node_delta(
+            packed.P, packed._weights, sol, i, unselected, k
+        ) == inter_node_exchange_delta(dense.D, sol, i, unselected, k)
+
+    # D[i, j] reads the packed triangle, every solver runs on it
+    assert len(packed.D) == len(dense) and packed.D[3, 17] == dense.D[3, 17]
+    assert np.all(packed.candidates() == dense.candidates())
+    assert np.all(GreedyCycle(packed, 11).solve() == GreedyCycle(dense, 11).solve())
+    tours, scores = solve_all_starts(packed, "regret", np.arange(5))
+    expected_tours, expected_scores = solve_all_starts(dense, "regret", np.arange(5))
+    assert np.all(tours == expected_tours) and np.all(scores == expected_scores)
+    expected, _, _ = local_search_steepest(
+        sol.copy(), unselected.copy(), dense.D, "intra_edge"
+    )
+    result, _, _ = local_search_steepest(sol, unselected, packed.D, "intra_edge")
+    assert np.all(result == expected)
+
+
+def test_coordinates_representation(tspa):
+    dense = tspa
+    matrix_free = TSP(dense._points, dense._weights, representation="coordinates")
+    assert len(matrix_free.D) == len(dense)
+    assert matrix_free.D[3, 17] == dense.D[3, 17]
+
+    for solve in [solve_nn_first, solve_nn_any, solve_greedy_cycle]:
+        expected = solve(dense.D, 11, dense.solution_size)
+        assert np.all(solve(matrix_free.D, 11, dense.solution_size) == expected)
+
+    sol, unselected = random_starting(len(dense), dense.solution_size, seed=7)
+    expected, _, _ = local_search_steepest(
+        sol.copy(), unselected.copy(), dense.D, "intra_edge"
+    )
+    result, _, _ = local_search_steepest(sol, unselected, matrix_free.D, "intra_edge")
+    assert np.all(result == expected)
+    assert matrix_free.score(result) == dense.score(expected)
+
+
+def test_reduce(tspa):
+    problem = tspa
+    bound = insertion_lower_bounds(problem._points, problem._weights)
+    size = problem.solution_size
+    tours = [solve_greedy_cycle(problem.D, start, size) for start in range(5)]
+    for tour in tours:
+        assert bound[tour].sum() <= problem.score(tour)
+
+    best = min(problem.score(tour) for tour in tours)
+    provable = problem.reduce(upper_bound=best)
+    for tour in tours:
+        if problem.score(tour) == best:
+            assert np.isin(tour, provable.nodes).all()
+    assert problem.reduce(upper_bound=np.sort(bound)[:100].sum()).nodes.size == 100
+    with pytest.raises(ValueError, match="no solution scores at most"):
+        problem.reduce(upper_bound=np.sort(bound)[:100].sum() - 1)
+    with pytest.raises(ValueError, match="no solution scores at most"):
+        problem.reduce(upper_bound=np.sort(bound)[:100].sum() - 1, keep=0.8)
+
+    tiny = TSP(problem._points[:4], problem._weights[:4])
+    with pytest.raises(ValueError, match="fewer than 3 nodes"):
+        tiny.reduce(keep=0.5)
+
+    reduced = problem.reduce(keep=0.8)
+    assert len(reduced) == 160 and reduced.solution_size == problem.solution_size
+    assert (reduced.nodes == np.sort(np.argsort(bound, kind="stable")[:160])).all()
+    assert reduced.D[3, 17] == problem.D[reduced.nodes[3], reduced.nodes[17]]
+
+    sol, unselected = random_starting(len(reduced), reduced.solution_size, seed=1)
+    result, _, _ = local_search_steepest(sol, unselected, reduced.D, "intra_edge")
+    assert len(np.unique(reduced.original(result))) == problem.solution_size
+    assert problem.score(reduced.original(result)) == reduced.score(result)
+
+    twice = reduced.reduce(keep=0.9)
+    assert len(twice) == 144 and np.isin(twice.nodes, reduced.nodes).all()
+    assert twice.original(np.arange(3)).tolist() == twice.nodes[:3].tolist()
+
+
+def test_candidates(tspa):
+    problem = tspa
+    closest = problem.candidates(10)
+    assert closest.shape == (len(problem), 10)
+    assert problem.candidates(10) is closest
+
+    for i in range(len(problem)):
+        costs = problem.D[i].copy()
+        costs[i] = np.inf
+        expected = np.argsort(costs, kind="stable")[:10]
+        assert np.all(closest[i] == expected)
+
+
+def test_from_csv_cache(tspa, tmp_path, monkeypatch):
+    monkeypatch.setenv("TSP_CACHE_DIR", str(tmp_path))
+    parsed = tspa
+
+    first = TSP.from_csv("data/TSPA.csv", dtype=np.int32)
+    assert len(list(tmp_path.iterdir())) == 1
+    second = TSP.from_csv("data/TSPA.csv", dtype=np.int32)
+    assert isinstance(second.D, np.memmap)
+    assert second.D.dtype == np.int32
+    assert np.all(second.D == first.D)
+    assert np.all(second.D == parsed.D)
+    assert np.all(second._weights == parsed._weights)
+
+    TSP.from_csv("data/TSPA.csv", representation="packed")
+    packed = TSP.from_csv("data/TSPA.csv", representation="packed")
+    assert isinstance(packed.P, np.memmap)
+    assert len(list(tmp_path.iterdir())) == 2
+
+    # a new format version never loads the old arrays
+    before = tsp.cache.cache_directory("data/TSPA.csv", np.int32, "dense")
+    monkeypatch.setattr(tsp.cache, "FORMAT_VERSION", tsp.cache.FORMAT_VERSION + 1)
+    assert tsp.cache.cache_directory("data/TSPA.csv", np.int32, "dense") != before
+
+
+def test_score_many(tspb):
+    problem = tspb
+    rng = np.random.default_rng(1)
+    tours = np.array(
+        [rng.permutation(len(problem))[: problem.solution_size] for _ in range(8)],
+        dtype=np.int32,
+    )
+    expected = [problem.score(tour) for tour in tours]
+    assert np.all(score_many(tours, problem.D) == expected)
+    assert np.all(problem.score_many(tours) == expected)
@@ -0,0 +1,64 @@
+import numpy as np
+
+from tsp.localsearch.descent import steepest_descent
+from tsp.localsearch.lazy import local_search_steepest_lazy
+from tsp.localsearch.twolevel import (
+    tour_between,
+    tour_flip,
+    tour_next,
+    tour_prev,
+    tour_replace,
+    tour_to_array,
+    two_level_list,
+)
+from tsp.utils import random_starting
+
+
+def same_cycle(a, b):
+    a, b = list(a), list(b)
+    i = b.index(a[0])
+    b = b[i:] + b[:i]
+    return a == b or a == [b[0]] + b[1:][::-1]
+
+
+def test_flip_matches_array_reversal():
+    rng = np.random.default_rng(0)
+    for n in [3, 5, 16, 50]:
+        sol = rng.permutation(2 * n)[:n]
+        tour = two_level_list(sol, 2 * n)
+        expected = list(sol)
+        for _ in range(200):
+            i, j = rng.integers(n, size=2)
+            a, b = expected[i], expected[j]
+            tour_flip(tour, a, b)
+            if i <= j:
+                expected[i : j + 1] = expected[i : j + 1][::-1]
+            else:
+                path = expected[i:] + expected[: j + 1]
+                expected = path[::-1] + expected[j + 1 : i]
+            result = tour_to_array(tour)
+            assert same_cycle(result, expected)
+            expected = list(result)
+            for p, v in enumerate(result):
+                assert tour_next(tour, v) == result[(p + 1) % n]
+                assert tour_prev(tour, v) == result[p - 1]
+
+
+def test_between_and_replace():
+    tour = two_level_list(np.array([4, 2, 0, 5, 1]), 7)
+    assert tour_between(tour, 2, 5, 1)
+    assert not tour_between(tour, 5, 2, 1)
+    assert tour_between(tour, 1, 4, 2)
+    tour_replace(tour, 0, 6)
+    assert tour_next(tour, 2) == 6 and tour_prev(tour, 5) == 6
+    assert list(tour_to_array(tour)) == [4, 2, 6, 5, 1]
+
+
+def test_lazy_two_level_reaches_local_optimum(tspa):
+    problem = tspa
+    for seed in range(3):
+        sol, unselected = random_starting(len(problem), problem.solution_size, seed)
+        sol, _, _ = local_search_steepest_lazy(sol, unselected, problem.D, True)
+        assert sorted(np.concatenate([sol, unselected])) == list(range(len(problem)))
+        improved, _ = steepest_descent(sol, unselected, problem.D, "intra_edge")
+        assert not improved
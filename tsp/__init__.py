@@ -1,25 +1,100 @@
-import matplotlib.pyplot as plt
+from typing import Literal, get_args
+
 import numpy as np
-from numba import njit
+from numba import njit, prange
+
+from tsp.cache import cache_directory, load_arrays, save_arrays
+from tsp.matrixfree import CoordinateMatrix
+from tsp.packed import PackedMatrix, packed_distances
+from tsp.packed import score as packed_score
+from tsp.reduction import insertion_lower_bounds, select_nodes
+
+Representation = Literal["dense", "packed", "coordinates"]
 
 
 class TSP:
-    def __init__(self, points, weights):
+    def __init__(
+        self,
+        points,
+        weights,
+        dtype=np.float64,
+        block_size=256,
+        representation: Representation = "dense",
+        matrix=None,
+    ):
+        """dtype can be set to an integer type (e.g. np.int32) to halve the memory
+        of D, all distances are rounded anyway
+
+        With representation="packed" the dense D is not built, instead P holds
+        the upper triangle of distances and D is a PackedMatrix reading it
+        (see tsp.packed)
+
+        With representation="coordinates" D is a CoordinateMatrix computing
+        entries on demand, nothing of size n^2 is stored (see tsp.matrixfree)
+
+        matrix is an already computed D (or P for the packed representation),
+        e.g. memory mapped from the cache"""
         self._points = points
         self._weights = weights
-
-        # calculate euclidian distance matrix
-        diffs = points[:, np.newaxis, :] - points[np.newaxis, :, :]
-        self.D = np.sqrt(np.sum(diffs**2, axis=-1))
-        self.D = np.floor(self.D + 0.5)  # mathematical rounding
-        self.D += weights
+        self._candidates = {}
+        self._solution_size = int(np.fix(len(points) / 2))
+        self.dtype = dtype
+        self.representation = representation
+        # original index of every node, None unless built by reduce
+        self.nodes = None
+        self.D = None
+        self.P = None
+        if representation == "packed":
+            self.P = matrix
+            if matrix is None:
+                self.P = packed_distances(points, dtype, block_size)
+            self.D = PackedMatrix(self.P, weights)
+        elif representation == "coordinates":
+            self.D = CoordinateMatrix(points, weights)
+        else:
+            self.D = matrix
+            if matrix is None:
+                self.D = distance_matrix(points, weights, dtype, block_size)
 
     @classmethod
-    def from_csv(cls, filename: str):
-        data = np.genfromtxt(filename, delimiter=";")
-        return cls(data[:, :2], data[:, 2])
+    def from_csv(
+        cls,
+        filename: str,
+        dtype=np.float64,
+        representation: Representation = "dense",
+        cache: bool = True,
+    ):
+        """With cache the parsed points, weights and the distance matrix are
+        stored as .npy files and memory mapped on later loads (see tsp.cache)"""
+        if not cache:
+            data = np.genfromtxt(filename, delimiter=";")
+            return cls(data[:, :2], data[:, 2], dtype, representation=representation)
+
+        matrix_name = {"dense": "D", "packed": "P"}.get(representation)
+        names = ["points", "weights"] + ([matrix_name] if matrix_name else [])
+
+        directory = cache_directory(filename, dtype, representation)
+        arrays = load_arrays(directory, names)
+        if arrays is not None:
+            return cls(
+                arrays["points"],
+                arrays["weights"],
+                dtype,
+                representation=representation,
+                matrix=arrays.get(matrix_name),
+            )
+
+        problem = cls.from_csv(filename, dtype, representation, cache=False)
+        arrays = {"points": problem._points, "weights": problem._weights}
+        if matrix_name:
+            arrays[matrix_name] = getattr(problem, matrix_name)
+        save_arrays(directory, arrays)
+        return problem
 
     def visualize(self, solution=None, title="TSP", outfilename="", labels=False):
+        # imported here so that headless workers never load the plotting stack
+        import matplotlib.pyplot as plt
+
         plt.clf()
         x = self._points[:, 0]
         y = self._points[:, 1]
@@ -64,13 +139,76 @@ class TSP:
 
     @property
     def solution_size(self) -> int:
-        """It is required for us to only use 50% of nodes in solution"""
-        return int(np.fix(len(self) / 2))
+        """It is required for us to only use 50% of nodes in solution (of the
+        original instance if this one is reduced)"""
+        return self._solution_size
+
+    def reduce(self, upper_bound=None, keep=None) -> "TSP":
+        """Instance without the nodes which cannot improve on a solution scoring
+        upper_bound and, if keep is given, with only that fraction of the nodes
+        (the ones with the smallest insertion lower bounds, see tsp.reduction)
+
+        The reduced instance has its own smaller D (same dtype and
+        representation) and the same solution_size, solvers and local search
+        run on it unchanged. Its solutions are mapped back with original.
+        Raises ValueError if fewer than solution_size nodes can score at most
+        upper_bound"""
+        bound = insertion_lower_bounds(
+            np.require(self._points, np.float64), np.require(self._weights, np.float64)
+        )
+        kept = select_nodes(bound, self.solution_size, upper_bound, keep)
+        reduced = TSP(
+            self._points[kept],
+            self._weights[kept],
+            self.dtype,
+            representation=self.representation,
+        )
+        reduced._solution_size = self.solution_size
+        reduced.nodes = self.original(kept)
+        return reduced
+
+    def original(self, solution: np.ndarray) -> np.ndarray:
+        """Nodes of the original instance for nodes of this (reduced) one,
+        scores are the same in both"""
+        if self.nodes is None:
+            return solution
+        return self.nodes[solution]
+
+    def candidates(self, k: int = 10) -> np.ndarray:
+        """k nearest neighbours of every node by weighted cost D[i, j],
+        built on first use and cached"""
+        if k not in self._candidates:
+            self._candidates[k] = nearest_neighbors(self.D, k)
+        return self._candidates[k]
 
     def score(self, solution: np.ndarray):
         """Return's the score of the solution"""
         return score(solution, self.D)
 
+    def score_many(self, tours: np.ndarray) -> np.ndarray:
+        """Scores of every row of a 2-D array of tours"""
+        return score_many(tours, self.D)
+
+
+def distance_matrix(points, weights, dtype=np.float64, block_size=256):
+    """Returns D[i, j] = round(euclidean(i, j)) + weights[j]
+
+    D is filled block of rows by block of rows, so the temporaries are of size
+    block_size x n instead of the n x n x 2 coordinate differences"""
+    n = len(points)
+    D = np.empty((n, n), dtype=dtype)
+    x = points[:, 0]
+    y = points[:, 1]
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        dx = x[start:stop, np.newaxis] - x[np.newaxis, :]
+        dy = y[start:stop, np.newaxis] - y[np.newaxis, :]
+        block = np.sqrt(dx * dx + dy * dy)
+        block = np.floor(block + 0.5)  # mathematical rounding
+        block += weights
+        D[start:stop] = block
+    return D
+
 
 @njit(cache=True)
 def score(solution: np.ndarray, D: np.ndarray):
@@ -78,3 +216,157 @@ def score(solution: np.ndarray, D: np.ndarray):
     for i in range(len(solution)):
         total_cost += D[solution[i - 1], solution[i]]
     return total_cost
+
+
+@njit(cache=True, parallel=True)
+def score_many(tours: np.ndarray, D):
+    """Scores of all tours stored as rows of a 2-D array, in parallel"""
+    scores = np.empty(len(tours), dtype=np.float64)
+    for t in prange(len(tours)):
+        scores[t] = score(tours[t], D)
+    return scores
+
+
+@njit(cache=True, parallel=True)
+def nearest_neighbors(D, k):
+    """Returns for every node the k other nodes with the smallest D[node, j],
+    ordered by cost (ties by index)
+
+    Each row is a partial selection keeping only the k best seen so far,
+    so a row costs O(n) comparisons instead of a full O(n log n) sort"""
+    n = len(D)
+    k = min(k, n - 1)
+    closest = np.empty((n, k), dtype=np.int64)
+    for i in prange(n):
+        costs = np.empty(k, dtype=np.float64)
+        size = 0
+        for j in range(n):
+            if j == i:
+                continue
+            cost = D[i, j]
+            if size == k and cost >= costs[k - 1]:
+                continue
+            pos = min(size, k - 1)
+            while pos > 0 and costs[pos - 1] > cost:
+                costs[pos] = costs[pos - 1]
+                closest[i, pos] = closest[i, pos - 1]
+                pos -= 1
+            costs[pos] = cost
+            closest[i, pos] = j
+            size = min(size + 1, k)
+    return closest
+
+
+def warmup(n: int = 20, seed: int = 0):
+    """Compiles (or loads from the numba on-disk cache) every public kernel for
+    all supported kinds of D: float64 and int32 matrices, both writable and
+    read-only (memory mapped from the instance cache), PackedMatrix over both
+    and CoordinateMatrix
+
+    Call it once at process start so the first real call does not pay
+    for compilation"""
+    from tsp.evolutionary import operator_1, operator_2
+    from tsp.largescale import large_scale_neighborhood_search
+    from tsp.localsearch import (
+        local_search_greedy,
+        local_search_steepest,
+        local_search_steepest_candidate_edge,
+        u_local_search_steepest,
+    )
+    from tsp.localsearch.lazy import local_search_steepest_lazy
+    from tsp.packed import inter_node_exchange_delta, intra_edge_exchange_delta
+    from tsp.solvers import (
+        Constructor,
+        construct_from_starts,
+        random_solve,
+        solve_greedy_cycle,
+        solve_nn_any,
+        solve_nn_first,
+        solve_regret_greedy_cycle,
+        solve_weighted_regret_greedy_cycle,
+    )
+    from tsp.utils import random_starting, random_starting_from_starting
+
+    rng = np.random.default_rng(seed)
+    points = rng.integers(0, 1000, size=(n, 2)).astype(np.float64)
+    weights = rng.integers(0, 500, size=n).astype(np.float64)
+
+    matrices = [CoordinateMatrix(points, weights)]
+    for dtype in [np.float64, np.int32]:
+        D = distance_matrix(points, weights, dtype)
+        readonly = D.copy()
+        readonly.flags.writeable = False
+        matrices += [D, readonly]
+
+        P = packed_distances(points, dtype)
+        readonly = P.copy()
+        readonly.flags.writeable = False
+        matrices += [PackedMatrix(P, weights), PackedMatrix(readonly, weights)]
+        sol, unselected = random_starting(n, n // 2, seed)
+        packed_score(sol, P, weights)
+        intra_edge_exchange_delta(P, weights, sol, 0, 2)
+        inter_node_exchange_delta(P, weights, sol, 0, unselected, 0)
+
+    insertion_lower_bounds(points, weights)
+    sol_size = n // 2
+    for D in matrices:
+        random_starting_from_starting(n, sol_size, seed)
+        random_solve(D, 0, sol_size)
+        for solve in [
+            solve_nn_first,
+            solve_nn_any,
+            solve_greedy_cycle,
+            solve_regret_greedy_cycle,
+        ]:
+            solve(D, 0, 3)
+        solve_weighted_regret_greedy_cycle(D, np.array([0, 1]), 3)
+        score(np.arange(3), D)
+        score_many(np.zeros((2, 3), dtype=np.int64), D)
+        score_many(np.zeros((2, 3), dtype=np.int32), D)
+        closest_nodes = nearest_neighbors(D, 10)
+        solve_nn_first(D, 0, 3, closest_nodes)
+        solve_nn_any(D, 0, 3, closest_nodes)
+        for constructor in range(len(get_args(Constructor))):
+            construct_from_starts(D, np.arange(2), 3, constructor, closest_nodes)
+
+        for intra_move in ["intra_edge", "intra_node"]:
+            sol, unselected = random_starting(n, sol_size, seed)
+            local_search_steepest(sol, unselected, D, intra_move)
+            sol, unselected = random_starting(n, sol_size, seed)
+            local_search_steepest(sol, unselected, D, intra_move, cached=True)
+            sol, unselected = random_starting(n, sol_size, seed)
+            local_search_steepest(sol, unselected, D, intra_move, dont_look=True)
+            sol, unselected = random_starting(n, sol_size, seed)
+            local_search_steepest(sol, unselected, D, intra_move, parallel=True)
+            sol, unselected = random_starting(n, sol_size, seed)
+            local_search_greedy(sol, unselected, D, intra_move, dont_look=True)
+            sol, unselected = random_starting(n, sol_size, seed)
+            local_search_greedy(sol, unselected, D, intra_move)
+
+        sol, unselected = random_starting(n, sol_size, seed)
+        local_search_steepest_candidate_edge(sol, unselected, D, closest_nodes)
+        sol, unselected = random_starting(n, sol_size, seed)
+        local_search_steepest_candidate_edge(sol, unselected, D, closest_nodes, True)
+        sol, unselected = random_starting(n, sol_size, seed)
+        local_search_steepest_candidate_edge(
+            sol, unselected, D, closest_nodes, False, True
+        )
+        sol, unselected = random_starting(n, sol_size, seed)
+        local_search_steepest_lazy(sol, unselected, D)
+        sol, unselected = random_starting(n, sol_size, seed)
+        local_search_steepest_lazy(sol, unselected, D, True)
+        for two_level in [False, True]:
+            sol, unselected = random_starting(n, sol_size, seed)
+            stats = np.zeros(6, dtype=np.int64)
+            local_search_steepest_lazy(sol, unselected, D, two_level, stats)
+        sol, unselected = random_starting(n, sol_size, seed)
+        u_local_search_steepest(sol, unselected, D, "intra_edge", 0.0, 0.0, 1)
+
+        x1 = random_starting(n, sol_size, seed)[0]
+        x2 = random_starting(n, sol_size, seed + 1)[0]
+        # the evolutionary loop passes rows of an int32 population matrix
+        population = np.stack([x1, x2]).astype(np.int32)
+        for x1, x2 in [(x1, x2), (population[0], population[1])]:
+            operator_1(x1, x2, D, sol_size)
+            operator_2(x1, x2, D, sol_size)
+        large_scale_neighborhood_search(n, sol_size, D, 0.0, True)
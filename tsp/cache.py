@@ -0,0 +1,50 @@
+"""Binary cache of parsed instances
+
+Arrays of an instance are stored as .npy files in a directory named after the
+hash of the csv contents (plus the requested dtype and representation and
+FORMAT_VERSION).
+They are loaded with mmap_mode="r", so processes working on the same instance
+share one page-cached copy and nothing has to be parsed or recomputed."""
+
+import hashlib
+import os
+
+import numpy as np
+
+# bump whenever the cached arrays would be computed differently (e.g. the
+# D[i, j] = round(distance) + weights[j] convention), old entries are then
+# never loaded
+FORMAT_VERSION = 1
+
+
+def cache_directory(filename: str, dtype, representation: str) -> str:
+    """Directory of the cached arrays, the root can be set with TSP_CACHE_DIR
+    and defaults to .cache next to the csv file"""
+    root = os.environ.get("TSP_CACHE_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(filename)), ".cache"
+    )
+    with open(filename, "rb") as f:
+        digest = hashlib.sha256(f.read())
+    key = f"{np.dtype(dtype).str}-{representation}-v{FORMAT_VERSION}"
+    digest.update(key.encode())
+    return os.path.join(root, digest.hexdigest()[:32])
+
+
+def load_arrays(directory: str, names: list[str]) -> dict | None:
+    """Memory maps all arrays, returns None if any of them is missing"""
+    paths = {name: os.path.join(directory, name + ".npy") for name in names}
+    if not all(os.path.exists(path) for path in paths.values()):
+        return None
+    return {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+
+
+def save_arrays(directory: str, arrays: dict):
+    """Every file is written under a temporary name and atomically renamed,
+    so concurrent workers never see partially written arrays"""
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        path = os.path.join(directory, name + ".npy")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
@@ -2,14 +2,13 @@ import time
 
 import numpy as np
 from numba import njit
-from tqdm import tqdm
 
-from tsp import score
+from tsp import score, score_many
 from tsp.solvers import solve_weighted_regret_greedy_cycle
 from tsp.utils import random_starting
 
 
-@njit
+@njit(cache=True)
 def operator_1(x1, x2, D, sol_size):
     """Recombination operator for TSP, takes 2 solutions and returns a single one
 
@@ -52,7 +51,7 @@ def operator_1(x1, x2, D, sol_size):
     return np.array(base)
 
 
-@njit
+@njit(cache=True)
 def operator_2(x1, x2, D, sol_size):
     """Recombination operator for TSP, takes 2 solutions and returns a single one
 
@@ -97,13 +96,12 @@ def solve_tsp_with_evolutionary(D, solution_size, timeout, popsize=20):
     - operator_1 - intersection and filling rest by random
     - operator_2 - difference of nodes of sol1 and sol2 and repair using heuristic
     """
-    # Generate an initial population X
+    # Generate an initial population X, one solution per row
     iters = 0
-    X = [
-        random_starting(len(D), solution_size, seed=np.random.randint(1000))[0]
-        for i in range(popsize)
-    ]
-    S = [score(x, D) for x in X]
+    X = np.empty((popsize, solution_size), dtype=np.int32)
+    for i in range(popsize):
+        X[i] = random_starting(len(D), solution_size, seed=np.random.randint(1000))[0]
+    S = score_many(X, D)
 
     end = time.perf_counter() + timeout
     while time.perf_counter() < end:
@@ -141,6 +139,8 @@ def solve_tsp_with_evolutionary(D, solution_size, timeout, popsize=20):
 if __name__ == "__main__":
     import sys
 
+    from tqdm import tqdm
+
     from tsp import TSP
 
     for prob in ["TSPA", "TSPB"]:
@@ -10,7 +10,7 @@ from tsp.solvers import solve_weighted_regret_greedy_cycle
 from tsp.utils import random_starting
 
 
-@numba.njit()
+@numba.njit(cache=True)
 def destroy(sol: np.ndarray, removal_fraction: float = 0.3) -> np.ndarray:
     """Remove single segment from solution"""
     n = len(sol)
@@ -20,7 +20,7 @@ def destroy(sol: np.ndarray, removal_fraction: float = 0.3) -> np.ndarray:
     return rolled[num_to_remove:].copy()
 
 
-@numba.njit()
+@numba.njit(cache=True)
 def large_scale_neighborhood_search(instance_size, sol_size, D, time_limit, with_ls):
     start_sol, unselected = random_starting(instance_size, sol_size, None)
     sol, _, _ = local_search_steepest(start_sol, unselected, D, "intra_edge")
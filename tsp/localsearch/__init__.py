@@ -9,8 +9,14 @@ from tsp import score
 from tsp.localsearch.descent import (
     IntraType,
     greedy_descent,
+    local_search_steepest_cached,
     steepest_descent,
     steepest_descent_candidate_edges,
+    steepest_descent_parallel,
+)
+from tsp.localsearch.dontlook import (
+    local_search_dont_look,
+    local_search_dont_look_two_level,
 )
 from tsp.localsearch.moves import perturb_sol
 
@@ -19,19 +25,42 @@ LocalSearchMethod = Literal["steepest", "greedy"]
 
 @njit(cache=True)
 def local_search_steepest(
-    sol, unselected, D, intra_move: IntraType
+    sol,
+    unselected,
+    D,
+    intra_move: IntraType,
+    cached=False,
+    dont_look=False,
+    parallel=False,
 ) -> tuple[np.ndarray, int, int]:
+    """With cached the deltas are kept between iterations and only the changed
+    ones are recomputed (see local_search_steepest_cached), the local optimum
+    is the same. With dont_look only the moves of active nodes are searched
+    (see tsp.localsearch.dontlook). With parallel every step evaluates the
+    neighbourhood on all cores (see steepest_descent_parallel), the local
+    optimum is the same. At most one of them can be set"""
+    if cached + dont_look + parallel > 1:
+        raise ValueError("cached, dont_look and parallel select different engines")
+    if dont_look:
+        return local_search_dont_look(sol, unselected, D, intra_move)
+    if cached:
+        return local_search_steepest_cached(sol, unselected, D, intra_move)
     num_iterations = 0
     delta_evaluations = 0
     while True:
-        improved, delta_evals = steepest_descent(sol, unselected, D, intra_move)
+        if parallel:
+            improved, delta_evals = steepest_descent_parallel(
+                sol, unselected, D, intra_move
+            )
+        else:
+            improved, delta_evals = steepest_descent(sol, unselected, D, intra_move)
         delta_evaluations += delta_evals
         num_iterations += 1
         if not improved:
             return sol, num_iterations, delta_evaluations
 
 
-@njit(cache=False)
+@njit(cache=True)
 def u_local_search_steepest(
     sol, unselected, D, intra_move: IntraType, start, time_limit, consecutive
 ) -> tuple[np.ndarray, int]:
@@ -79,10 +108,23 @@ def u_local_search_steepest(
     return sol, num_iterations, inner_counter
 
 
-@njit(cache=False)
+@njit(cache=True)
 def local_search_steepest_candidate_edge(
-    sol, unselected, D, closest_nodes
+    sol, unselected, D, closest_nodes, dont_look=False, two_level=False
 ) -> tuple[np.ndarray, int]:
+    """closest_nodes are the candidate lists, usually the index cached by
+    TSP.candidates() so that it is built once per instance. two_level keeps
+    the tour in a two-level list for large instances (implies dont_look)"""
+    if two_level:
+        sol, num_iterations, _ = local_search_dont_look_two_level(
+            sol, unselected, D, closest_nodes
+        )
+        return sol, num_iterations
+    if dont_look:
+        sol, num_iterations, _ = local_search_dont_look(
+            sol, unselected, D, "intra_edge", True, closest_nodes
+        )
+        return sol, num_iterations
     num_iterations = 200
     while True:
         # print("steepest_candidate_edge, iteration", num_iterations)
@@ -92,10 +134,15 @@ def local_search_steepest_candidate_edge(
             return sol, num_iterations
 
 
-@njit()
+@njit(cache=True)
 def local_search_greedy(
-    sol, unselected, D, intra_move: IntraType
+    sol, unselected, D, intra_move: IntraType, dont_look=False
 ) -> tuple[np.ndarray, int]:
+    if dont_look:
+        sol, num_iterations, _ = local_search_dont_look(
+            sol, unselected, D, intra_move, False
+        )
+        return sol, num_iterations
     num_iterations = 0
     while True:
         improved = greedy_descent(sol, unselected, D, intra_move)
@@ -1,7 +1,17 @@
+import math
+
 import numpy as np
-from numba import njit
+from numba import njit, prange
 
+from tsp.localsearch.insertion import (
+    best_insertion,
+    insertion_table,
+    update_insertion_table,
+)
 from tsp.localsearch.moves import (
+    INTER_NODE,
+    INTRA_EDGE,
+    INTRA_NODE,
     IntraType,
     Move,
     apply_inter_move_candidate_edge,
@@ -9,15 +19,22 @@ from tsp.localsearch.moves import (
     apply_move,
     inter_node_candidate_edge_exchange_delta_next,
     inter_node_candidate_edge_exchange_delta_prev,
+    inter_node_exchange,
     inter_node_exchange_delta,
+    inter_node_exchange_delta_row,
     intra_candidate_edge_exchange_delta_next,
     intra_candidate_edge_exchange_delta_prev,
+    intra_edge_exchange,
     intra_edge_exchange_delta,
+    intra_edge_exchange_delta_row,
+    intra_node_exchange,
     intra_node_exchange_delta,
+    reversal_segment,
+    tour_edge_costs,
 )
 
 
-@njit()
+@njit(cache=True)
 def steepest_descent(sol, unselected, D, intra_move: IntraType) -> tuple[bool, int]:
     """Takes one step of steepest descent using inter-route node exchange
     and for intra-route it uses node exchange or edge exchange
@@ -28,7 +45,8 @@ def steepest_descent(sol, unselected, D, intra_move: IntraType) -> tuple[bool, i
     n = len(sol)
     improved = False
     best_delta = 0.0
-    best_move: Move | None = None
+    best_move: Move = (-1, -1, -1)
+    edges = tour_edge_costs(D, sol)
 
     if intra_move == "intra_node":
         # Intra-route node exchange:
@@ -38,35 +56,98 @@ def steepest_descent(sol, unselected, D, intra_move: IntraType) -> tuple[bool, i
                 delta_evaluations += 1
                 if delta < best_delta:
                     best_delta = delta
-                    best_move = ("intra_node", i, j)
+                    best_move = (INTRA_NODE, i, j)
     else:
-        # Intra-route edge exchange:
+        # Intra-route edge exchange, the first minimum in scan order
+        row = np.empty(n)
         for i in range(n):
-            for j in range(n):
-                if abs(i - j) < 2:
-                    continue
-                delta = intra_edge_exchange_delta(D, sol, i, j)
-                delta_evaluations += 1
-                if delta < best_delta:
-                    best_delta = delta
-                    best_move = ("intra_edge", i, j)
+            intra_edge_exchange_delta_row(D, sol, edges, i, row)
+            j = np.argmin(row)
+            if row[j] < best_delta:
+                best_delta = row[j]
+                best_move = (INTRA_EDGE, i, j)
+        delta_evaluations += n * n - 3 * n
 
     # Inter-route node exchange:
-    for i in range(n):
-        for k in range(len(unselected)):
-            delta = inter_node_exchange_delta(D, sol, i, unselected, k)
-            if delta < best_delta:
-                delta_evaluations += 1
-                best_delta = delta
-                best_move = ("inter_node", i, k)
+    m = len(unselected)
+    row = np.empty(m)
+    for i in range(n if m > 0 else 0):
+        inter_node_exchange_delta_row(D, sol, edges, unselected, i, row)
+        k = np.argmin(row)
+        if row[k] < best_delta:
+            best_delta = row[k]
+            best_move = (INTER_NODE, i, k)
+    delta_evaluations += n * m
 
-    if best_move is not None:
+    if best_move[0] != -1:
         apply_move(sol, unselected, best_move)
         improved = True
     return improved, delta_evaluations
 
 
-@njit(cache=False)
+@njit(cache=True)
+def intra_node_row_minimum(D, sol, i):
+    """Best exchange of sol[i] with a later position (first on a tie)"""
+    best, arg = np.inf, -1
+    for j in range(i + 1, len(sol)):
+        delta = intra_node_exchange_delta(D, sol, i, j)
+        if delta < best:
+            best, arg = delta, j
+    return best, arg
+
+
+@njit(cache=True, parallel=True)
+def steepest_descent_parallel(
+    sol, unselected, D, intra_move: IntraType
+) -> tuple[bool, int]:
+    """steepest_descent with the moves of every position i (a row of the
+    neighbourhood) evaluated in parallel. Each row keeps its best intra-route
+    and inter-route move, they are reduced in the order of the serial scan,
+    so the applied move is the same as in steepest_descent"""
+    n = len(sol)
+    m = len(unselected)
+    intra_node = intra_move == "intra_node"
+    edges = tour_edge_costs(D, sol)
+    intra_best = np.full(n, np.inf)
+    intra_arg = np.full(n, -1, dtype=np.int64)
+    inter_best = np.full(n, np.inf)
+    inter_arg = np.full(n, -1, dtype=np.int64)
+    for p in prange(n):
+        i = np.int64(p)  # the prange index is unsigned
+        if intra_node:
+            intra_best[i], intra_arg[i] = intra_node_row_minimum(D, sol, i)
+        else:
+            intra_row = np.empty(n)
+            intra_edge_exchange_delta_row(D, sol, edges, i, intra_row)
+            intra_arg[i] = np.argmin(intra_row)
+            intra_best[i] = intra_row[intra_arg[i]]
+        if m > 0:
+            inter_row = np.empty(m)
+            inter_node_exchange_delta_row(D, sol, edges, unselected, i, inter_row)
+            inter_arg[i] = np.argmin(inter_row)
+            inter_best[i] = inter_row[inter_arg[i]]
+
+    best_delta = 0.0
+    best_move: Move = (-1, -1, -1)
+    intra_code = INTRA_NODE if intra_node else INTRA_EDGE
+    for i in range(n):
+        if intra_best[i] < best_delta:
+            best_delta = intra_best[i]
+            best_move = (intra_code, i, intra_arg[i])
+    for i in range(n):
+        if inter_best[i] < best_delta:
+            best_delta = inter_best[i]
+            best_move = (INTER_NODE, i, inter_arg[i])
+
+    delta_evaluations = n * (n - 1) // 2 if intra_node else n * n - 3 * n
+    delta_evaluations += n * m
+    if best_move[0] == -1:
+        return False, delta_evaluations
+    apply_move(sol, unselected, best_move)
+    return True, delta_evaluations
+
+
+@njit(cache=True)
 def steepest_descent_candidate_edges(sol, unselected, D, closest_nodes):
     """
     Takes one step of steepest descent using inter-route node exchange
@@ -77,7 +158,7 @@ def steepest_descent_candidate_edges(sol, unselected, D, closest_nodes):
     n = len(sol)
     improved = False
     best_delta = 0.0
-    best_move_type = -1  # -1: No move, 0: Intra-edge, 1: Inter-node
+    best_move_type = -1  # -1: No move
     best_i = -1
     best_j_or_k = -1
     best_prev_or_next = -1
@@ -129,7 +210,7 @@ def steepest_descent_candidate_edges(sol, unselected, D, closest_nodes):
                     delta = intra_candidate_edge_exchange_delta_next(D, sol, i, j)
                 if delta < best_delta:
                     best_delta = delta
-                    best_move_type = 0
+                    best_move_type = INTRA_EDGE
                     best_i = i
                     best_j_or_k = j
                     best_prev_or_next = prev_or_next
@@ -149,14 +230,14 @@ def steepest_descent_candidate_edges(sol, unselected, D, closest_nodes):
                     )
                 if delta < best_delta:
                     best_delta = delta
-                    best_move_type = 1
+                    best_move_type = INTER_NODE
                     best_i = i
                     best_j_or_k = k
                     best_prev_or_next = prev_or_next
         # raise NotImplementedError("Implement this function")
 
     if best_move_type != -1:
-        if best_move_type == 0:
+        if best_move_type == INTRA_EDGE:
             # Apply intra-edge move
             # print(
             #     "Applying intra-edge move, best_i, best_j_or_k, best_prev_or_next",
@@ -165,7 +246,7 @@ def steepest_descent_candidate_edges(sol, unselected, D, closest_nodes):
             #     best_prev_or_next,
             # )
             apply_intra_move_candidate_edge(sol, best_i, best_j_or_k, best_prev_or_next)
-        elif best_move_type == 1:
+        elif best_move_type == INTER_NODE:
             # Apply inter-node move
             # print(
             #     "Applying inter-node move, best_i, best_j_or_k, best_prev_or_next",
@@ -181,45 +262,189 @@ def steepest_descent_candidate_edges(sol, unselected, D, closest_nodes):
     return improved
 
 
-@njit()
+@njit(cache=True)
 def greedy_descent(sol, unselected, D, intra_move: IntraType) -> bool:
     """Takes one step of greedy descent using inter-route node exchange
     and for intra-route it uses node exchange or edge exchange
     Returns: True if objective function improved and False otherwise
         function changes sol and unselected
+
+    Moves are visited in a random order without materializing them: index
+    t < n * n is the cell (t // n, t % n) of the intra-route grid (cells
+    which are not a move are skipped), the remaining n * m indices are the
+    inter-route exchanges. The indices are walked from a random offset with
+    a random stride coprime to their number, so every move is examined once.
     """
     n = len(sol)
-    moves: list[Move] = []
-    if intra_move == "intra_node":
-        # Intra-route node exchange:
-        for i in range(n):
-            for j in range(i + 1, n):
-                moves.append(("intra_node", i, j))
-    else:
-        # Intra-route edge exchange:
-        for i in range(n):
-            for j in range(i + 2, n):
-                moves.append(("intra_edge", i, j))
+    m = len(unselected)
+    intra = INTRA_NODE if intra_move == "intra_node" else INTRA_EDGE
+    min_gap = 1 if intra == INTRA_NODE else 2
+    grid = n * n
+    total = grid + n * m
 
-    # Inter-route node exchange:
+    index = np.random.randint(total)
+    stride = 1
+    if total > 1:
+        stride = np.random.randint(1, total)
+        while math.gcd(stride, total) != 1:
+            stride = np.random.randint(1, total)
+
+    for _ in range(total):
+        index = (index + stride) % total
+        if index < grid:
+            i, j = index // n, index % n
+            if j < i + min_gap:
+                continue
+            if intra == INTRA_NODE:
+                delta = intra_node_exchange_delta(D, sol, i, j)
+            else:
+                delta = intra_edge_exchange_delta(D, sol, i, j)
+            if delta < 0.0:
+                if intra == INTRA_NODE:
+                    intra_node_exchange(sol, i, j)
+                else:
+                    intra_edge_exchange(sol, i, j)
+                return True
+        else:
+            i, k = (index - grid) // m, (index - grid) % m
+            if inter_node_exchange_delta(D, sol, i, unselected, k) < 0.0:
+                inter_node_exchange(sol, i, unselected, k)
+                return True
+    return False
+
+
+@njit(cache=True)
+def intra_delta(D, sol, i, j, move_type):
+    if move_type == INTRA_NODE:
+        return intra_node_exchange_delta(D, sol, i, j)
+    return intra_edge_exchange_delta(D, sol, i, j)
+
+
+@njit(cache=True)
+def intra_row_minimum(intra, i, min_gap):
+    best, arg = np.inf, -1
+    for j in range(i + min_gap, len(intra)):
+        if intra[i, j] < best:
+            best, arg = intra[i, j], j
+    return best, arg
+
+
+@njit(cache=True)
+def dirty_positions(changed, offsets):
+    """Positions p such that p + o changed for some o in offsets"""
+    n = len(changed)
+    dirty = np.zeros(n, dtype=np.bool_)
+    for p in range(n):
+        for o in offsets:
+            if changed[(p + o) % n]:
+                dirty[p] = True
+    return dirty
+
+
+@njit(cache=True)
+def local_search_steepest_cached(
+    sol, unselected, D, intra_move: IntraType
+) -> tuple[np.ndarray, int, int]:
+    """Steepest descent reaching the same local optimum as repeated
+    steepest_descent, but the deltas are kept between iterations:
+    - intra[i, j] (i < j) for the intra-route move of positions i and j,
+      together with the best entry (first in scan order) of every row,
+    - the best exchange of every unselected node (tsp.localsearch.insertion),
+      nodes which cannot improve the solution anywhere are skipped.
+
+    After a move only entries depending on changed positions are recomputed,
+    plus the exchanges of the node that became unselected. Selecting the next
+    move is a scan over the row minima and the best exchanges which breaks
+    ties in the order of steepest_descent"""
+    n = len(sol)
+    intra_code = INTRA_NODE if intra_move == "intra_node" else INTRA_EDGE
+    min_gap = 1 if intra_code == INTRA_NODE else 2
+    # intra-edge delta of position p depends on sol[p], sol[p + 1],
+    # intra-node and inter-node deltas on sol[p - 1], sol[p], sol[p + 1]
+    intra_offsets = (
+        np.array([-1, 0, 1]) if intra_code == INTRA_NODE else np.array([0, 1])
+    )
+    inter_offsets = np.array([-1, 0, 1])
+    delta_evaluations = 0
+
+    intra = np.full((n, n), np.inf)
+    intra_best = np.empty(n)
+    intra_arg = np.empty(n, dtype=np.int64)
     for i in range(n):
-        for k in range(len(unselected)):
-            moves.append(("inter_node", i, k))
+        for j in range(i + min_gap, n):
+            intra[i, j] = intra_delta(D, sol, i, j, intra_code)
+            delta_evaluations += 1
+        intra_best[i], intra_arg[i] = intra_row_minimum(intra, i, min_gap)
 
-    indices = np.arange(len(moves))
-    np.random.shuffle(indices)
+    table = insertion_table(D, sol, unselected)
 
-    improved = False
-    for m in indices:
-        mov_type, i, j = moves[m]
-        if mov_type == "intra_node":
-            delta = intra_node_exchange_delta(D, sol, i, j)
-        elif mov_type == "intra_edge":
-            delta = intra_edge_exchange_delta(D, sol, i, j)
+    num_iterations = 0
+    while True:
+        num_iterations += 1
+        best_delta = 0.0
+        best_move: Move = (-1, -1, -1)
+        for i in range(n):
+            if intra_best[i] < best_delta:
+                best_delta = intra_best[i]
+                best_move = (intra_code, i, intra_arg[i])
+        delta, i, k, evaluations = best_insertion(
+            table, D, sol, unselected, best_delta
+        )
+        delta_evaluations += evaluations
+        if k != -1:
+            best_delta = delta
+            best_move = (INTER_NODE, i, k)
+        if best_move[0] == -1:
+            return sol, num_iterations, delta_evaluations
+
+        move_type, i, j = best_move
+        changed = np.zeros(n, dtype=np.bool_)
+        entered, new_column = -1, -1
+        if move_type == INTRA_EDGE:
+            start, length = reversal_segment(n, i, j)
+            for t in range(length):
+                changed[(start + t) % n] = True
+        elif move_type == INTRA_NODE:
+            changed[i] = True
+            changed[j] = True
         else:
-            delta = inter_node_exchange_delta(D, sol, i, unselected, j)
-        if delta < 0.0:
-            apply_move(sol, unselected, moves[m])
-            improved = True
-            break
-    return improved
+            changed[i] = True
+            entered, new_column = unselected[j], j
+        apply_move(sol, unselected, best_move)
+
+        # intra-route deltas
+        dirty = dirty_positions(changed, intra_offsets)
+        dirty_list = np.nonzero(dirty)[0]
+        for q in range(n):
+            if dirty[q]:
+                for j in range(q + min_gap, n):
+                    intra[q, j] = intra_delta(D, sol, q, j, intra_code)
+                    delta_evaluations += 1
+                intra_best[q], intra_arg[q] = intra_row_minimum(intra, q, min_gap)
+                continue
+            rescan = False
+            for j in dirty_list:
+                if j < q + min_gap:
+                    continue
+                old = intra[q, j]
+                intra[q, j] = intra_delta(D, sol, q, j, intra_code)
+                delta_evaluations += 1
+                if j == intra_arg[q]:
+                    rescan = intra[q, j] > old
+                    intra_best[q] = intra[q, j]
+            if rescan:
+                intra_best[q], intra_arg[q] = intra_row_minimum(intra, q, min_gap)
+                continue
+            for j in dirty_list:
+                if j < q + min_gap:
+                    continue
+                if intra[q, j] < intra_best[q] or (
+                    intra[q, j] == intra_best[q] and j < intra_arg[q]
+                ):
+                    intra_best[q], intra_arg[q] = intra[q, j], j
+
+        # inter-route deltas
+        dirty = dirty_positions(changed, inter_offsets)
+        delta_evaluations += update_insertion_table(
+            table, D, sol, unselected, dirty, entered, new_column
+        )
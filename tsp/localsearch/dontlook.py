@@ -0,0 +1,316 @@
+"""Don't-look bits
+
+Instead of scanning the whole neighbourhood in every iteration, nodes are kept
+in a FIFO queue of active nodes. A popped node is examined by searching only
+the moves that involve it, if none of them improves it stays inactive (its
+don't-look bit is set). Applying a move re-activates the nodes at the ends of
+the changed edges.
+
+The same driver serves the full neighbourhood (intra-route moves with every
+position and inter-route exchange with every unselected node) and the
+candidate-edge neighbourhood (moves introducing an edge to one of the
+closest_nodes). For large instances the candidate-edge search can keep the
+tour in a two-level list instead of an array."""
+
+import numpy as np
+from numba import njit
+
+from tsp.localsearch.moves import (
+    INTER_NODE,
+    INTRA_EDGE,
+    INTRA_NODE,
+    IntraType,
+    apply_inter_move_candidate_edge,
+    apply_intra_move_candidate_edge,
+    inter_node_candidate_edge_exchange_delta_next,
+    inter_node_candidate_edge_exchange_delta_prev,
+    inter_node_exchange,
+    inter_node_exchange_delta,
+    intra_candidate_edge_exchange_delta_next,
+    intra_candidate_edge_exchange_delta_prev,
+    intra_edge_exchange,
+    intra_edge_exchange_delta,
+    intra_node_exchange,
+    intra_node_exchange_delta,
+    replace_delta,
+    two_opt_delta,
+)
+from tsp.localsearch.twolevel import (
+    in_tour,
+    tour_flip,
+    tour_next,
+    tour_prev,
+    tour_replace,
+    tour_to_array,
+    two_level_list,
+)
+
+# move kinds examined for the popped node, besides the move codes of moves.py
+CANDIDATE_INTRA = 3
+CANDIDATE_INTER = 4
+
+
+@njit(cache=True)
+def push(queue, active, state, node):
+    """state holds [head, size] of the circular queue"""
+    if active[node]:
+        return
+    active[node] = True
+    queue[(state[0] + state[1]) % len(queue)] = node
+    state[1] += 1
+
+
+@njit(cache=True)
+def pop(queue, active, state):
+    node = queue[state[0]]
+    state[0] = (state[0] + 1) % len(queue)
+    state[1] -= 1
+    active[node] = False
+    return node
+
+
+@njit(cache=True)
+def push_around(queue, active, state, sol, i):
+    """Activate the node at position i and its tour neighbours"""
+    n = len(sol)
+    push(queue, active, state, sol[(i - 1) % n])
+    push(queue, active, state, sol[i % n])
+    push(queue, active, state, sol[(i + 1) % n])
+
+
+@njit(cache=True)
+def update_positions(sol, pos, start, count):
+    n = len(sol)
+    for t in range(count):
+        p = (start + t) % n
+        pos[sol[p]] = p
+
+
+@njit(cache=True)
+def node_move(sol, unselected, D, pos, upos, i, intra_node, closest_nodes, steepest):
+    """Best (or with steepest=False the first, starting from a random offset)
+    improving move involving the node at position i.
+    Returns: (delta, kind, p, q, evaluations), delta 0.0 if there is none"""
+    n = len(sol)
+    m = len(unselected)
+    best_delta, best_kind, best_p, best_q = 0.0, -1, -1, -1
+    evaluations = 0
+
+    if closest_nodes is not None:
+        candidates = closest_nodes[sol[i]]
+        offset = 0 if steepest else np.random.randint(len(candidates))
+        for t in range(len(candidates)):
+            c = candidates[(offset + t) % len(candidates)]
+            j = pos[c]
+            if j == -1:
+                k = upos[c]
+                kind = CANDIDATE_INTER
+                delta_prev = inter_node_candidate_edge_exchange_delta_prev(
+                    D, sol, i, unselected, k
+                )
+                delta_next = inter_node_candidate_edge_exchange_delta_next(
+                    D, sol, i, unselected, k
+                )
+            else:
+                if (j - i) % n in (0, 1, n - 1):
+                    continue
+                k = j
+                kind = CANDIDATE_INTRA
+                delta_prev = intra_candidate_edge_exchange_delta_prev(D, sol, i, j)
+                delta_next = intra_candidate_edge_exchange_delta_next(D, sol, i, j)
+            evaluations += 2
+            if delta_prev < best_delta:
+                best_delta, best_kind, best_p, best_q = delta_prev, kind, k, 0
+            if delta_next < best_delta:
+                best_delta, best_kind, best_p, best_q = delta_next, kind, k, 1
+            if best_kind != -1 and not steepest:
+                break
+        return best_delta, best_kind, best_p, best_q, evaluations
+
+    offset = 0 if steepest else np.random.randint(n)
+    for t in range(n):
+        j = (offset + t) % n
+        if intra_node:
+            if j == i:
+                continue
+            delta = intra_node_exchange_delta(D, sol, i, j)
+            evaluations += 1
+            if delta < best_delta:
+                best_delta, best_kind, best_p, best_q = delta, INTRA_NODE, i, j
+        else:
+            # both edges of the node: (sol[i - 1], sol[i]) and (sol[i], sol[i + 1])
+            for p in ((i - 1) % n, i):
+                if (j - p) % n in (0, 1, n - 1):
+                    continue
+                delta = intra_edge_exchange_delta(D, sol, p, j)
+                evaluations += 1
+                if delta < best_delta:
+                    best_delta, best_kind, best_p, best_q = delta, INTRA_EDGE, p, j
+        if best_kind != -1 and not steepest:
+            return best_delta, best_kind, best_p, best_q, evaluations
+
+    if m == 0:
+        return best_delta, best_kind, best_p, best_q, evaluations
+    offset = 0 if steepest else np.random.randint(m)
+    for t in range(m):
+        k = (offset + t) % m
+        delta = inter_node_exchange_delta(D, sol, i, unselected, k)
+        evaluations += 1
+        if delta < best_delta:
+            best_delta, best_kind, best_p, best_q = delta, INTER_NODE, i, k
+            if not steepest:
+                break
+    return best_delta, best_kind, best_p, best_q, evaluations
+
+
+@njit(cache=True)
+def apply_node_move(sol, unselected, pos, upos, queue, active, state, i, kind, p, q):
+    """Applies the move found by node_move for position i, updates positions
+    and activates the nodes at the ends of the changed edges"""
+    n = len(sol)
+    if kind == INTRA_NODE:
+        intra_node_exchange(sol, p, q)
+        pos[sol[p]], pos[sol[q]] = p, q
+        push_around(queue, active, state, sol, p)
+        push_around(queue, active, state, sol, q)
+    elif kind == INTRA_EDGE:
+        start, length = intra_edge_exchange(sol, p, q)
+        update_positions(sol, pos, start, length)
+        push_around(queue, active, state, sol, start - 1)
+        push_around(queue, active, state, sol, start + length)
+    elif kind == INTER_NODE:
+        pos[sol[p]], upos[sol[p]] = -1, q
+        inter_node_exchange(sol, p, unselected, q)
+        pos[sol[p]], upos[sol[p]] = p, -1
+        push_around(queue, active, state, sol, p)
+    elif kind == CANDIDATE_INTRA:
+        start, length = apply_intra_move_candidate_edge(sol, i, p, q)
+        update_positions(sol, pos, start, length)
+        push_around(queue, active, state, sol, start - 1)
+        push_around(queue, active, state, sol, start + length)
+    else:
+        r = (i - 1) % n if q == 0 else (i + 1) % n
+        pos[sol[r]], upos[sol[r]] = -1, p
+        apply_inter_move_candidate_edge(sol, unselected, i, p, q)
+        pos[sol[r]], upos[sol[r]] = r, -1
+        push_around(queue, active, state, sol, r)
+        push_around(queue, active, state, sol, i)
+
+
+@njit(cache=True)
+def local_search_dont_look(
+    sol, unselected, D, intra_move: IntraType, steepest=True, closest_nodes=None
+) -> tuple[np.ndarray, int, int]:
+    """Local search driven by don't-look bits, initially every selected node
+    is active. With closest_nodes only the candidate-edge moves are used
+    (intra_move is then ignored).
+    Returns: (sol, number of applied moves + 1, delta evaluations)"""
+    num_nodes = len(D)
+    intra_node = intra_move == "intra_node"
+    pos = np.full(num_nodes, -1, dtype=np.int64)
+    upos = np.full(num_nodes, -1, dtype=np.int64)
+    for i in range(len(sol)):
+        pos[sol[i]] = i
+    for k in range(len(unselected)):
+        upos[unselected[k]] = k
+
+    queue = np.empty(num_nodes, dtype=np.int64)
+    active = np.zeros(num_nodes, dtype=np.bool_)
+    state = np.zeros(2, dtype=np.int64)
+    for node in sol:
+        push(queue, active, state, node)
+
+    num_iterations = 1
+    delta_evaluations = 0
+    while state[1] > 0:
+        node = pop(queue, active, state)
+        i = pos[node]
+        if i == -1:  # left the tour after it was activated
+            continue
+        delta, kind, p, q, evaluations = node_move(
+            sol, unselected, D, pos, upos, i, intra_node, closest_nodes, steepest
+        )
+        delta_evaluations += evaluations
+        if kind == -1:
+            continue
+        apply_node_move(sol, unselected, pos, upos, queue, active, state, i, kind, p, q)
+        if pos[node] != -1:
+            push(queue, active, state, node)
+        num_iterations += 1
+    return sol, num_iterations, delta_evaluations
+
+
+@njit(cache=True)
+def local_search_dont_look_two_level(
+    sol, unselected, D, closest_nodes
+) -> tuple[np.ndarray, int, int]:
+    """Candidate-edge search with don't-look bits, as local_search_dont_look,
+    but the tour is kept in a two-level list (tsp.localsearch.twolevel) so
+    applying a 2-opt move costs O(sqrt(n)) instead of O(n)"""
+    num_nodes = len(D)
+    tour = two_level_list(sol, num_nodes)
+    upos = np.full(num_nodes, -1, dtype=np.int64)
+    for k in range(len(unselected)):
+        upos[unselected[k]] = k
+
+    queue = np.empty(num_nodes, dtype=np.int64)
+    active = np.zeros(num_nodes, dtype=np.bool_)
+    state = np.zeros(2, dtype=np.int64)
+    for node in sol:
+        push(queue, active, state, node)
+
+    num_iterations = 1
+    delta_evaluations = 0
+    while state[1] > 0:
+        a = pop(queue, active, state)
+        if not in_tour(tour, a):
+            continue
+        a_prev, a_next = tour_prev(tour, a), tour_next(tour, a)
+        best_delta, best_kind, best_c, best_q = 0.0, -1, -1, -1
+        for c in closest_nodes[a]:
+            if in_tour(tour, c):
+                if c == a or c == a_prev or c == a_next:
+                    continue
+                kind = CANDIDATE_INTRA
+                delta_prev = two_opt_delta(D, a, a_prev, c, tour_prev(tour, c))
+                delta_next = two_opt_delta(D, a, a_next, c, tour_next(tour, c))
+            else:
+                kind = CANDIDATE_INTER
+                delta_prev = replace_delta(
+                    D, tour_prev(tour, a_prev), a_prev, a, c
+                )
+                delta_next = replace_delta(
+                    D, a, a_next, tour_next(tour, a_next), c
+                )
+            delta_evaluations += 2
+            if delta_prev < best_delta:
+                best_delta, best_kind, best_c, best_q = delta_prev, kind, c, 0
+            if delta_next < best_delta:
+                best_delta, best_kind, best_c, best_q = delta_next, kind, c, 1
+        if best_kind == -1:
+            continue
+
+        c = best_c
+        if best_kind == CANDIDATE_INTRA:
+            # adds (a, c) and (a_prev, c_prev) or (a_next, c_next)
+            if best_q == 0:
+                c_prev = tour_prev(tour, c)
+                tour_flip(tour, a, c_prev)
+                changed = (a_prev, c_prev, c)
+            else:
+                c_next = tour_next(tour, c)
+                tour_flip(tour, a_next, c)
+                changed = (a_next, c_next, c)
+        else:
+            old = a_prev if best_q == 0 else a_next
+            k = upos[c]
+            unselected[k], upos[old], upos[c] = old, k, -1
+            tour_replace(tour, old, c)
+            changed = (tour_prev(tour, c), c, tour_next(tour, c))
+        for node in changed:
+            push(queue, active, state, node)
+        push(queue, active, state, a)
+        num_iterations += 1
+
+    sol[:] = tour_to_array(tour)
+    return sol, num_iterations, delta_evaluations
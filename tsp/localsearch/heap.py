@@ -0,0 +1,141 @@
+"""Binary heap of moves kept in arrays
+
+heap = (keys, moves, meta), entry i has the delta keys[i] and the move
+moves[i] = (move code, four nodes). Entries are ordered like the tuples
+(key, *move), the same order heapq gives to (delta, move) tuples. meta holds
+the size and the counters below. The capacity is fixed, heap_reserve returns
+a larger heap when the next pushes would not fit. Entries which are no longer
+applicable are removed with heap_compact, the caller decides which.
+"""
+
+import numpy as np
+from numba import njit
+
+# meta fields
+SIZE = 0
+PUSHES = 1
+POPS = 2
+STALE_POPS = 3
+COMPACTIONS = 4
+PEAK_SIZE = 5
+
+
+@njit(cache=True)
+def move_heap(capacity=1024):
+    capacity = max(capacity, 1)
+    return (
+        np.empty(capacity),
+        np.empty((capacity, 5), dtype=np.int64),
+        np.zeros(6, dtype=np.int64),
+    )
+
+
+@njit(cache=True)
+def entry(keys, moves, i):
+    return (keys[i], moves[i, 0], moves[i, 1], moves[i, 2], moves[i, 3], moves[i, 4])
+
+
+@njit(cache=True)
+def store(keys, moves, i, e):
+    keys[i] = e[0]
+    moves[i, 0], moves[i, 1], moves[i, 2] = e[1], e[2], e[3]
+    moves[i, 3], moves[i, 4] = e[4], e[5]
+
+
+@njit(cache=True)
+def sift_up(keys, moves, i):
+    """Moves entry i up, the larger parents are shifted down into the hole"""
+    e = entry(keys, moves, i)
+    while i > 0:
+        parent = (i - 1) // 2
+        p = entry(keys, moves, parent)
+        if not e < p:
+            break
+        store(keys, moves, i, p)
+        i = parent
+    store(keys, moves, i, e)
+
+
+@njit(cache=True)
+def sift_down(keys, moves, size, i):
+    """Moves entry i down, the smaller children are shifted up into the hole"""
+    e = entry(keys, moves, i)
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        c = entry(keys, moves, child)
+        if child + 1 < size:
+            right = entry(keys, moves, child + 1)
+            if right < c:
+                child, c = child + 1, right
+        if not c < e:
+            break
+        store(keys, moves, i, c)
+        i = child
+    store(keys, moves, i, e)
+
+
+@njit(cache=True)
+def heap_reserve(heap, count):
+    """Heap with room for count more entries, the capacity is at least doubled
+    when it grows"""
+    keys, moves, meta = heap
+    size = meta[SIZE]
+    if size + count <= len(keys):
+        return heap
+    capacity = max(2 * len(keys), size + count)
+    grown_keys = np.empty(capacity)
+    grown_moves = np.empty((capacity, 5), dtype=np.int64)
+    grown_keys[:size] = keys[:size]
+    grown_moves[:size] = moves[:size]
+    return grown_keys, grown_moves, meta
+
+
+@njit(cache=True)
+def heap_push(heap, key, move_type, a, b, c, d):
+    keys, moves, meta = heap
+    size = meta[SIZE]
+    if size == len(keys):
+        raise IndexError("move heap is full, use heap_reserve")
+    store(keys, moves, size, (key, move_type, a, b, c, d))
+    meta[SIZE] = size + 1
+    meta[PUSHES] += 1
+    meta[PEAK_SIZE] = max(meta[PEAK_SIZE], size + 1)
+    sift_up(keys, moves, size)
+
+
+@njit(cache=True)
+def heap_pop(heap):
+    """Removes the smallest entry, returns (key, move code, four nodes)"""
+    keys, moves, meta = heap
+    key = keys[0]
+    move = (moves[0, 0], moves[0, 1], moves[0, 2], moves[0, 3], moves[0, 4])
+    size = meta[SIZE] - 1
+    meta[SIZE] = size
+    meta[POPS] += 1
+    if size > 0:
+        store(keys, moves, 0, entry(keys, moves, size))
+        sift_down(keys, moves, size, 0)
+    return key, move
+
+
+@njit(cache=True)
+def heapify(heap):
+    keys, moves, meta = heap
+    for i in range(meta[SIZE] // 2 - 1, -1, -1):
+        sift_down(keys, moves, meta[SIZE], i)
+
+
+@njit(cache=True)
+def heap_compact(heap, keep):
+    """Removes the entries i with keep[i] False"""
+    keys, moves, meta = heap
+    size = 0
+    for i in range(meta[SIZE]):
+        if keep[i]:
+            store(keys, moves, size, entry(keys, moves, i))
+            size += 1
+    meta[SIZE] = size
+    meta[COMPACTIONS] += 1
+    heapify(heap)
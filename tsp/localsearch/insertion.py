@@ -0,0 +1,150 @@
+"""Best exchange of every unselected node
+
+Instead of the deltas of all len(sol) * len(unselected) inter-route
+exchanges, the table keeps for every unselected[k] only its best improving
+exchange: best[k] = inter_node_exchange_delta(D, sol, position[k], unselected,
+k) < 0, the first position on a tie. When position[k] is -1, best[k] is only
+a lower bound of the deltas of unselected[k] (0 if none of them is known to
+be negative) and the node is scanned once it could be selected.
+
+With D[x, y] = distance(x, y) + weights[y] the delta of putting u in place
+of a between before and after is
+    distance(before, u) + distance(u, after) + weights[u]
+    - distance(before, a) - distance(a, after) - weights[a]
+so it is not negative if 2 * distance(u, nearest selected node) + weights[u]
+is at least distance(before, a) + distance(a, after) + weights[a]. These are
+the column bound and removed[i] of position i, such exchanges are never
+evaluated. The weights are only known up to a constant,
+weight[y] = D[0, y] - D[y, 0] = weights[y] - weights[0], which cancels out.
+Nodes whose bound is not below any removed[i] (usually the heavily weighted
+ones) are inactive and skipped entirely. into[k] is the smallest
+D[x, unselected[k]] over the selected nodes x, removing a node from sol
+leaves it a lower bound.
+
+table = (best, position, into, weight, removed, active)"""
+
+import numpy as np
+from numba import njit
+
+from tsp.localsearch.moves import inter_node_exchange_delta
+
+
+@njit(cache=True)
+def insertion_table(D, sol, unselected):
+    m = len(unselected)
+    weight = np.empty(len(D))
+    for y in range(len(D)):
+        weight[y] = D[0, y] - D[y, 0]
+    table = (
+        np.empty(m),
+        np.full(m, -1, dtype=np.int64),
+        np.empty(m),
+        weight,
+        np.empty(len(sol)),
+        np.zeros(m, dtype=np.bool_),
+    )
+    for k in range(m):
+        column_bound(table, D, sol, unselected, k)
+    update_insertion_table(table, D, sol, unselected, np.zeros(len(sol), np.bool_))
+    return table
+
+
+@njit(cache=True)
+def column_bound(table, D, sol, unselected, k):
+    into = table[2]
+    into[k] = np.inf
+    for x in sol:
+        into[k] = min(into[k], D[x, unselected[k]])
+
+
+@njit(cache=True)
+def scan_column(table, D, sol, unselected, k):
+    best, position, into, weight, removed, _ = table
+    bound = 2 * into[k] - weight[unselected[k]]
+    best[k], position[k] = 0.0, -1
+    evaluations = 0
+    for i in range(len(sol)):
+        if bound >= removed[i]:
+            continue
+        delta = inter_node_exchange_delta(D, sol, i, unselected, k)
+        evaluations += 1
+        if delta < best[k]:
+            best[k], position[k] = delta, i
+    return evaluations
+
+
+@njit(cache=True)
+def update_insertion_table(
+    table, D, sol, unselected, dirty, entered=-1, new_column=-1
+):
+    """Brings the table up to date after a move. dirty[p] marks the positions
+    whose exchange deltas changed, entered is the node which entered sol and
+    new_column the index of the node which left it (-1 for intra-route moves).
+    Returns: delta evaluations"""
+    best, position, into, weight, removed, active = table
+    n = len(sol)
+    m = len(unselected)
+    for i in range(n):
+        after = sol[(i + 1) % n]
+        removed[i] = D[sol[i - 1], sol[i]] + D[sol[i], after] - weight[after]
+    max_removed = removed.max()
+    evaluations = 0
+
+    bound = np.empty(m)
+    previous = position.copy()
+    for k in range(m):
+        if k == new_column:
+            column_bound(table, D, sol, unselected, k)
+        elif entered != -1:
+            into[k] = min(into[k], D[entered, unselected[k]])
+        bound[k] = 2 * into[k] - weight[unselected[k]]
+        if bound[k] >= max_removed:
+            active[k] = False
+            continue
+        if not active[k] or k == new_column:
+            best[k], position[k] = bound[k] - max_removed, -1
+            previous[k] = -1
+            active[k] = True
+            continue
+        # entries at clean positions did not change and are >= best[k]
+        p = position[k]
+        if p != -1 and dirty[p]:
+            old = best[k]
+            if bound[k] < removed[p]:
+                best[k] = inter_node_exchange_delta(D, sol, p, unselected, k)
+                evaluations += 1
+            else:
+                best[k] = 0.0
+            if best[k] > old:
+                best[k], position[k] = old, -1
+
+    columns = np.nonzero(active)[0]
+    for q in np.nonzero(dirty)[0]:
+        for k in columns:
+            if q == previous[k] or bound[k] >= removed[q]:
+                continue
+            delta = inter_node_exchange_delta(D, sol, q, unselected, k)
+            evaluations += 1
+            if delta < best[k] or (delta == best[k] and q < position[k]):
+                best[k], position[k] = delta, q
+    return evaluations
+
+
+@njit(cache=True)
+def best_insertion(table, D, sol, unselected, limit):
+    """The smallest (delta, position, k) with delta < limit <= 0, nodes known
+    only by a lower bound are scanned when they could be the smallest.
+    Returns: (delta, position, k, delta evaluations), k is -1 if there is none"""
+    best, position = table[:2]
+    active = table[5]
+    evaluations = 0
+    while True:
+        delta, i, k = limit, -1, -1
+        for c in range(len(best)):
+            if not active[c]:
+                continue
+            if best[c] < delta or (best[c] == delta and k != -1 and position[c] < i):
+                delta, i, k = best[c], position[c], c
+        if k == -1 or i != -1:
+            return delta, i, k, evaluations
+        evaluations += scan_column(table, D, sol, unselected, k)
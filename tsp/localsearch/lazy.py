@@ -1,25 +1,51 @@
-import heapq
 import sys
 
 import numpy as np
 from numba import njit
 
+from tsp.localsearch.heap import (
+    SIZE,
+    STALE_POPS,
+    heap_compact,
+    heap_pop,
+    heap_push,
+    heap_reserve,
+    move_heap,
+)
 from tsp.localsearch.moves import (
+    INTER_NODE,
+    INTRA_EDGE,
     inter_node_exchange_delta,
+    inter_node_exchange_delta_row,
     intra_edge_exchange_delta,
+    intra_edge_exchange_delta_row,
+    replace_delta,
+    reversal_segment,
+    reverse_segment,
+    tour_edge_costs,
+    two_opt_delta,
+)
+from tsp.localsearch.twolevel import (
+    in_tour,
+    tour_flip,
+    tour_next,
+    tour_prev,
+    tour_replace,
+    tour_to_array,
+    two_level_list,
 )
 from tsp.utils import random_starting
 
-NULL = np.iinfo(np.int16).max
-
-NODE = 0
-EDGE = 1
+NULL = -1
+# the move heap is compacted when it doubles in size, but not below this
+COMPACTION_SIZE = 1 << 16
 
 
-@njit()
+@njit(cache=True)
 def add_edge_exchanges_for_edge(heap, D, sol, i):
     evals = 0
     n = len(sol)
+    heap = heap_reserve(heap, 2 * n)
     for j in range(n):
         if abs(i - j) < 2:
             continue
@@ -32,19 +58,20 @@ def add_edge_exchanges_for_edge(heap, D, sol, i):
         delta = intra_edge_exchange_delta(D, sol, i, j)
         evals += 1
         if delta < 0:
-            heapq.heappush(heap, (delta, (EDGE, a, a_next, b, b_next)))
+            heap_push(heap, delta, INTRA_EDGE, a, a_next, b, b_next)
 
         # Reversed direction
         delta = intra_edge_exchange_delta(D, sol, j, i)
         evals += 1
         if delta < 0:
-            heapq.heappush(heap, (delta, (EDGE, b, b_next, a, a_next)))
-    return evals
+            heap_push(heap, delta, INTRA_EDGE, b, b_next, a, a_next)
+    return heap, evals
 
 
-@njit()
+@njit(cache=True)
 def add_node_exchanges_for_node_from_sol(heap, D, sol, unselected, i):
     evals = 0
+    heap = heap_reserve(heap, len(unselected))
     for k in range(len(unselected)):
         delta = inter_node_exchange_delta(D, sol, i, unselected, k)
         evals += 1
@@ -53,13 +80,16 @@ def add_node_exchanges_for_node_from_sol(heap, D, sol, unselected, i):
             n = len(sol)
             a_next = sol[(i + 1) % n]
             a_prev = sol[i - 1]
-            heapq.heappush(heap, (delta, (NODE, a_prev, a, a_next, unselected[k])))
-    return evals
+            heap_push(
+                heap, delta, INTER_NODE, a_prev, a, a_next, unselected[k]
+            )
+    return heap, evals
 
 
-@njit()
+@njit(cache=True)
 def add_node_exchanges_for_node_from_unselected(heap, D, sol, unselected, k):
     evals = 0
+    heap = heap_reserve(heap, len(sol))
     for i in range(len(sol)):
         delta = inter_node_exchange_delta(D, sol, i, unselected, k)
         evals += 1
@@ -68,148 +98,350 @@ def add_node_exchanges_for_node_from_unselected(heap, D, sol, unselected, k):
             n = len(sol)
             a_next = sol[(i + 1) % n]
             a_prev = sol[i - 1]
-            heapq.heappush(heap, (delta, (NODE, a_prev, a, a_next, unselected[k])))
-    return evals
-
-
-@njit()
-def local_search_steepest_lazy(sol, unselected, D) -> tuple[np.ndarray, int, int]:
+            heap_push(
+                heap, delta, INTER_NODE, a_prev, a, a_next, unselected[k]
+            )
+    return heap, evals
+
+
+@njit(cache=True)
+def local_search_steepest_lazy(
+    sol, unselected, D, two_level=False, stats=None
+) -> tuple[np.ndarray, int, int]:
+    """With two_level the tour is kept in a two-level list, see
+    local_search_lazy_two_level. If stats (int64 array of 6) is given, it
+    receives the counters of the move heap, see tsp.localsearch.heap"""
+    if two_level:
+        return local_search_lazy_two_level(sol, unselected, D, stats)
     num_iterations = 0
-    delta_evals = 0
 
     U = array_map(unselected, len(D))
-    E = get_edge_matrix(sol, len(D))
+    P = array_map(sol, len(D))
+    succ = get_successors(sol, len(D))
 
     # first iteration - evaluate all moves
-    moves_pq, evals = evaluate_all_moves(sol, unselected, D)
-    delta_evals += evals
-    while moves_pq:
+    heap, evals = evaluate_all_moves(sol, unselected, D)
+    meta = heap[2]
+    limit = max(COMPACTION_SIZE, 2 * meta[SIZE])
+    while meta[SIZE] > 0:
+        if meta[SIZE] > limit:
+            compact_moves(heap, succ, U)
+            limit = max(COMPACTION_SIZE, 2 * meta[SIZE])
         num_iterations += 1
-        delta, move = heapq.heappop(moves_pq)
+        delta, move = heap_pop(heap)
+        if not applicable(succ, U, move):
+            meta[STALE_POPS] += 1
+            continue
         move_type = move[0]
-        if move_type == EDGE:
+        n = len(sol)
+        if move_type == INTRA_EDGE:
             a, a_next, b, b_next = move[1:]
-            if E[a, a_next] == NULL or E[b, b_next] == NULL:
-                continue  # not applicable, we cannot remove inexistent edges
+            i, j = P[a], P[b]
+            start, length = reversal_segment(n, i, j)
 
-            i, j = E[a, a_next], E[b, b_next]
-
-            # update edge matrix
-            E[a, a_next] = NULL
-            E[a, b] = i
-            E[b, b_next] = NULL
-            E[a_next, b_next] = j
-
-            # Reverse the edges between the two nodes
-            xj, xi = j, i
-            n = len(sol)
-            if xj < xi:
-                xj += n
-            rolled_arr = np.roll(sol, -int(xi))
-
-            for x in range(1, xj - xi):
-                left, right = rolled_arr[x], rolled_arr[x + 1]
-                E[left, right] = NULL
-                E[right, left] = (j - x) % n
-
-            rolled_arr[1 : xj - xi + 1] = rolled_arr[1 : xj - xi + 1][::-1]
-            sol = np.roll(rolled_arr, int(xi))
+            # edges at positions start - 1, ..., start + length - 1 change
+            reverse_segment(sol, start, length)
+            for x in range(start - 1, start + length):
+                succ[sol[x % n]] = sol[(x + 1) % n]
+                P[sol[x % n]] = x % n
 
             # Add new moves to the priority queue
-            for x in range(i, j + 1):
-                evals += add_edge_exchanges_for_edge(moves_pq, D, sol, x)
-                evals += add_node_exchanges_for_node_from_sol(
-                    moves_pq, D, sol, unselected, x
+            for x in range(start - 1, start + length):
+                heap, e = add_edge_exchanges_for_edge(heap, D, sol, x % n)
+                evals += e
+                heap, e = add_node_exchanges_for_node_from_sol(
+                    heap, D, sol, unselected, x % n
                 )
-            evals += add_node_exchanges_for_node_from_sol(
-                moves_pq, D, sol, unselected, (j + 1) % n
+                evals += e
+            heap, e = add_node_exchanges_for_node_from_sol(
+                heap, D, sol, unselected, (start + length) % n
             )
+            evals += e
 
         else:
-            n = len(sol)
             a_prev, a, a_next, node = move[1:]
-            if E[a_prev, a] == NULL or E[a, a_next] == NULL or U[node] == NULL:
-                continue  # not applicable
-
-            i = E[a, a_next]
+            i = P[a]
             k = U[node]
             sol[i], unselected[k] = node, a
 
-            # update edge matrix and unselected map
-            E[a_prev, a] = NULL
-            E[a, a_next] = NULL
-            E[a_prev, node] = (i - 1) % len(sol)
-            E[node, a_next] = i
-            U[node] = NULL
-            U[a] = k
+            # update successors, positions and unselected map
+            succ[a_prev], succ[node], succ[a] = node, a_next, NULL
+            P[node], P[a] = i, NULL
+            U[node], U[a] = NULL, k
+
+            for x in ((i - 1) % n, i):
+                heap, e = add_edge_exchanges_for_edge(heap, D, sol, x)
+                evals += e
+            for x in ((i - 1) % n, i, (i + 1) % n):
+                heap, e = add_node_exchanges_for_node_from_sol(
+                    heap, D, sol, unselected, x
+                )
+                evals += e
+            heap, e = add_node_exchanges_for_node_from_unselected(
+                heap, D, sol, unselected, k
+            )
+            evals += e
 
-            evals += add_edge_exchanges_for_edge(moves_pq, D, sol, (i - 1) % len(sol))
-            evals += add_edge_exchanges_for_edge(moves_pq, D, sol, i)
+    if stats is not None:
+        stats[:] = meta
+    return sol, num_iterations, evals
 
-            evals += add_node_exchanges_for_node_from_sol(
-                moves_pq, D, sol, unselected, (i - 1) % n
-            )
-            evals += add_node_exchanges_for_node_from_sol(
-                moves_pq, D, sol, unselected, i
-            )
-            evals += add_node_exchanges_for_node_from_sol(
-                moves_pq, D, sol, unselected, (i + 1) % n
-            )
 
-            evals += add_node_exchanges_for_node_from_unselected(
-                moves_pq, D, sol, unselected, k
-            )
+@njit(cache=True)
+def applicable(succ, U, move):
+    move_type, a, b, c, d = move
+    if move_type == INTRA_EDGE:
+        # we cannot remove inexistent edges
+        return succ[a] == b and succ[c] == d
+    return succ[a] == b and succ[b] == c and U[d] != NULL
 
-    return sol, num_iterations, evals
+
+@njit(cache=True)
+def compact_moves(heap, succ, U):
+    keys, moves, meta = heap
+    keep = np.empty(meta[SIZE], dtype=np.bool_)
+    for i in range(meta[SIZE]):
+        move = (moves[i, 0], moves[i, 1], moves[i, 2], moves[i, 3], moves[i, 4])
+        keep[i] = applicable(succ, U, move)
+    heap_compact(heap, keep)
 
 
-@njit()
+@njit(cache=True)
 def evaluate_all_moves(sol, unselected, D):
     """Evaluates all possible improving moves and returns a priority queue of moves"""
-    evals = 0
-    all_moves = []
     n = len(sol)
+    m = len(unselected)
+    heap = move_heap(4 * n)
+    edges = tour_edge_costs(D, sol)
+    delta = np.empty(max(n, m))
 
-    # Intra-route edge exchange:
+    # Intra-route edge exchange, one row of deltas at a time so that memory
+    # stays linear:
     for i in range(n):
+        intra_edge_exchange_delta_row(D, sol, edges, i, delta)
+        heap = heap_reserve(heap, n)
+        a, a_next = sol[i], sol[(i + 1) % n]
         for j in range(n):
-            if abs(i - j) < 2:
-                continue
-            delta = intra_edge_exchange_delta(D, sol, i, j)
-            evals += 1
-            if delta >= 0:
-                continue
-
-            a, b = sol[i], sol[j]
-            a_next, b_next = sol[(i + 1) % n], sol[(j + 1) % n]
-            all_moves.append((delta, (EDGE, a, a_next, b, b_next)))
+            if delta[j] < 0:
+                b, b_next = sol[j], sol[(j + 1) % n]
+                heap_push(heap, delta[j], INTRA_EDGE, a, a_next, b, b_next)
 
     # Inter-route node exchange:
     for i in range(n):
-        for k in range(len(unselected)):
-            delta = inter_node_exchange_delta(D, sol, i, unselected, k)
+        inter_node_exchange_delta_row(D, sol, edges, unselected, i, delta)
+        heap = heap_reserve(heap, m)
+        a_prev, a, a_next = sol[i - 1], sol[i], sol[(i + 1) % n]
+        for k in range(m):
+            if delta[k] < 0:
+                heap_push(heap, delta[k], INTER_NODE, a_prev, a, a_next, unselected[k])
+    return heap, n * n - 3 * n + n * m
+
+
+@njit(cache=True)
+def add_two_opt_moves(heap, D, tour, x, y):
+    """Pushes improving 2-opt moves removing the tour edge x -> y and another
+    edge u -> v. Both reconnections are kept, for the current orientation and
+    for the one after a reversal turns exactly one of the edges around, so
+    reversals never call for re-evaluating the moves of the reversed edges"""
+    evals = 0
+    heap = heap_reserve(heap, 2 * len(tour[0]))
+    for u in tour[0]:
+        v = tour_next(tour, u)
+        if u == x or u == y or v == x:
+            continue
+        delta = two_opt_delta(D, x, y, u, v)
+        evals += 1
+        if delta < 0:
+            heap_push(heap, delta, INTRA_EDGE, x, y, u, v)
+        delta = two_opt_delta(D, y, x, u, v)
+        evals += 1
+        if delta < 0:
+            heap_push(heap, delta, INTRA_EDGE, y, x, u, v)
+    return heap, evals
+
+
+@njit(cache=True)
+def add_replace_moves_for_node(heap, D, tour, unselected, a):
+    evals = 0
+    heap = heap_reserve(heap, len(unselected))
+    a_prev, a_next = tour_prev(tour, a), tour_next(tour, a)
+    for node in unselected:
+        delta = replace_delta(D, a_prev, a, a_next, node)
+        evals += 1
+        if delta < 0:
+            heap_push(heap, delta, INTER_NODE, a_prev, a, a_next, node)
+    return heap, evals
+
+
+@njit(cache=True)
+def add_replace_moves_for_unselected(heap, D, tour, node):
+    evals = 0
+    heap = heap_reserve(heap, len(tour[0]))
+    for a in tour[0]:
+        a_prev, a_next = tour_prev(tour, a), tour_next(tour, a)
+        delta = replace_delta(D, a_prev, a, a_next, node)
+        evals += 1
+        if delta < 0:
+            heap_push(heap, delta, INTER_NODE, a_prev, a, a_next, node)
+    return heap, evals
+
+
+@njit(cache=True)
+def oriented(tour, a, b):
+    """The tour edge between a and b in its current direction"""
+    return (a, b) if tour_next(tour, a) == b else (b, a)
+
+
+@njit(cache=True)
+def edge_exists(tour, a, b):
+    return in_tour(tour, a) and (tour_next(tour, a) == b or tour_prev(tour, a) == b)
+
+
+@njit(cache=True)
+def compact_tour_moves(heap, tour):
+    """Drops the moves whose edges or nodes are gone, the direction of the
+    edges does not matter"""
+    keys, moves, meta = heap
+    keep = np.empty(meta[SIZE], dtype=np.bool_)
+    for i in range(meta[SIZE]):
+        move_type, a, b, c, d = moves[i]
+        if move_type == INTRA_EDGE:
+            keep[i] = edge_exists(tour, a, b) and edge_exists(tour, c, d)
+        else:
+            keep[i] = (
+                edge_exists(tour, a, b)
+                and edge_exists(tour, b, c)
+                and not in_tour(tour, d)
+            )
+    heap_compact(heap, keep)
+
+
+@njit(cache=True)
+def local_search_lazy_two_level(
+    sol, unselected, D, stats=None
+) -> tuple[np.ndarray, int, int]:
+    """Steepest search over a list of improving moves (2-opt and inter-route
+    exchange) on a two-level list tour. Moves are stored by the nodes of the
+    removed edges, a move is applied if its edges exist in the same relative
+    direction (reversed together, the move is applied reversed), kept aside
+    until the next applied move if they exist in opposite directions and
+    dropped otherwise. After a move only the new edges and the exchanges of
+    their end nodes are evaluated"""
+    num_nodes = len(D)
+    tour = two_level_list(sol, num_nodes)
+    U = array_map(unselected, num_nodes)
+
+    n = len(sol)
+    heap = move_heap(4 * n)
+    evals = 0
+    for i in range(n):
+        heap = heap_reserve(heap, 2 * n + len(unselected))
+        x, y = sol[i], sol[(i + 1) % n]
+        for j in range(i + 2, n):
+            u, v = sol[j], sol[(j + 1) % n]
+            if v == x:
+                continue
+            delta = two_opt_delta(D, x, y, u, v)
+            evals += 1
+            if delta < 0:
+                heap_push(heap, delta, INTRA_EDGE, x, y, u, v)
+            delta = two_opt_delta(D, y, x, u, v)
             evals += 1
             if delta < 0:
-                a = sol[i]
-                a_next = sol[(i + 1) % n]
-                a_prev = sol[i - 1]
-                all_moves.append((delta, (NODE, a_prev, a, a_next, unselected[k])))
+                heap_push(heap, delta, INTRA_EDGE, y, x, u, v)
+        a_prev = sol[i - 1]
+        for node in unselected:
+            delta = replace_delta(D, a_prev, x, y, node)
+            evals += 1
+            if delta < 0:
+                heap_push(heap, delta, INTER_NODE, a_prev, x, y, node)
+
+    # moves whose edges exist in opposite directions, they are not applicable
+    # now but may be once a reversal turns one of the edges around
+    deferred = move_heap()
+    meta = heap[2]
+    limit = max(COMPACTION_SIZE, 2 * meta[SIZE])
+    num_iterations = 0
+    while meta[SIZE] > 0:
+        if meta[SIZE] > limit:
+            compact_tour_moves(heap, tour)
+            limit = max(COMPACTION_SIZE, 2 * meta[SIZE])
+        num_iterations += 1
+        delta, move = heap_pop(heap)
+        move_type, a, a_next, b, b_next = move
+        if move_type == INTRA_EDGE:
+            if not in_tour(tour, a) or not in_tour(tour, b):
+                meta[STALE_POPS] += 1
+                continue
+            if tour_next(tour, a) == a_next and tour_next(tour, b) == b_next:
+                tour_flip(tour, a_next, b)
+            elif tour_prev(tour, a) == a_next and tour_prev(tour, b) == b_next:
+                tour_flip(tour, a, b_next)
+            else:
+                meta[STALE_POPS] += 1
+                if edge_exists(tour, a, a_next) and edge_exists(tour, b, b_next):
+                    deferred = heap_reserve(deferred, 1)
+                    heap_push(deferred, delta, *move)
+                continue
+            heap = restore(heap, deferred)
+            for x, y in (oriented(tour, a, b), oriented(tour, a_next, b_next)):
+                heap, e = add_two_opt_moves(heap, D, tour, x, y)
+                evals += e
+            for node in (a, a_next, b, b_next):
+                heap, e = add_replace_moves_for_node(heap, D, tour, unselected, node)
+                evals += e
+        else:
+            a_prev, a, a_next, node = a, a_next, b, b_next
+            if not in_tour(tour, a) or in_tour(tour, node):
+                meta[STALE_POPS] += 1
+                continue
+            forward = tour_prev(tour, a) == a_prev and tour_next(tour, a) == a_next
+            backward = tour_next(tour, a) == a_prev and tour_prev(tour, a) == a_next
+            if not forward and not backward:
+                meta[STALE_POPS] += 1
+                continue
+            k = U[node]
+            unselected[k], U[a], U[node] = a, k, NULL
+            tour_replace(tour, a, node)
+            heap = restore(heap, deferred)
+            node_prev, node_next = tour_prev(tour, node), tour_next(tour, node)
+            for x, y in ((node_prev, node), (node, node_next)):
+                heap, e = add_two_opt_moves(heap, D, tour, x, y)
+                evals += e
+            for x in (node_prev, node, node_next):
+                heap, e = add_replace_moves_for_node(heap, D, tour, unselected, x)
+                evals += e
+            heap, e = add_replace_moves_for_unselected(heap, D, tour, a)
+            evals += e
+
+    if stats is not None:
+        stats[:] = meta
+    sol[:] = tour_to_array(tour)
+    return sol, num_iterations, evals
+
 
-    heapq.heapify(all_moves)
-    return all_moves, evals
+@njit(cache=True)
+def restore(heap, deferred):
+    """Moves the deferred moves back to the heap"""
+    heap = heap_reserve(heap, deferred[2][SIZE])
+    while deferred[2][SIZE] > 0:
+        delta, move = heap_pop(deferred)
+        heap_push(heap, delta, *move)
+    return heap
 
 
-@njit()
-def get_edge_matrix(sol, size):
-    edges = np.ones((size, size), dtype=np.int16) * NULL
+@njit(cache=True)
+def get_successors(sol, size):
+    """succ[v] is the node after v in sol, NULL for nodes not in sol"""
+    succ = np.full(size, NULL, dtype=np.int64)
     for i in range(len(sol)):
-        edges[sol[i], sol[(i + 1) % len(sol)]] = i
-    return edges
+        succ[sol[i]] = sol[(i + 1) % len(sol)]
+    return succ
 
 
-@njit()
+@njit(cache=True)
 def array_map(array, size):
-    res = np.ones(size, dtype=np.int16) * NULL
+    res = np.full(size, NULL, dtype=np.int64)
     for i, k in enumerate(array):
         res[k] = i
     return res
@@ -3,21 +3,44 @@ from typing import Literal
 import numpy as np
 from numba import njit
 
-Move = tuple[Literal["intra_node", "intra_edge", "inter_node"], int, int]
 IntraType = Literal["intra_edge"]
 
+# integer move codes, the order breaks ties between equal deltas in lazy search
+INTER_NODE = 0
+INTRA_EDGE = 1
+INTRA_NODE = 2
 
-@njit(cache=False)
+# (move code, i, j), for INTER_NODE j indexes unselected
+Move = tuple[int, int, int]
+
+
+@njit(cache=True)
+def two_opt_delta(D, a, a_next, b, b_next):
+    """Change in objective function if edges (a, a_next) and (b, b_next) are
+    replaced with (a, b) and (a_next, b_next)"""
+    return D[b_next, a_next] + D[a, b] - D[a, a_next] - D[b_next, b]
+
+
+@njit(cache=True)
+def replace_delta(D, before, old, after, new):
+    """Change in objective function if old, visited between before and after,
+    is replaced with new"""
+    return D[before, new] + D[new, after] - D[before, old] - D[old, after]
+
+
+@njit(cache=True)
 def apply_intra_move_candidate_edge(sol, i, j, best_prev_or_next):
+    """Introduces the candidate edge (sol[i], sol[j]) by exchanging the edges
+    before (prev) or after (next) both nodes.
+    Returns: (start, length) of the reversed positions"""
     if i > j:
         i, j = j, i
     if best_prev_or_next == 0:
-        sol[i:j] = np.flip(sol[i:j])
-    else:
-        sol[i + 1 : j + 1] = np.flip(sol[i + 1 : j + 1])
+        return intra_edge_exchange(sol, (i - 1) % len(sol), j - 1)
+    return intra_edge_exchange(sol, i, j)
 
 
-@njit(cache=False)
+@njit(cache=True)
 def apply_inter_move_candidate_edge(sol, unselected, i, k, best_prev_or_next):
     if best_prev_or_next == 0:
         sol[i - 1], unselected[k] = unselected[k], sol[i - 1]
@@ -25,7 +48,7 @@ def apply_inter_move_candidate_edge(sol, unselected, i, k, best_prev_or_next):
         sol[(i + 1) % len(sol)], unselected[k] = unselected[k], sol[(i + 1) % len(sol)]
 
 
-@njit(cache=False)
+@njit(cache=True)
 def intra_candidate_edge_exchange_delta_prev(D, sol, i, j):
     """Calculate change in objective function if you exchange edges from i-th and j-th nodes"""
     a = sol[i]
@@ -36,7 +59,7 @@ def intra_candidate_edge_exchange_delta_prev(D, sol, i, j):
     return D[b_prev, a_prev] + D[a, b] - D[a, a_prev] - D[b_prev, b]
 
 
-@njit(cache=False)
+@njit(cache=True)
 def intra_candidate_edge_exchange_delta_next(D, sol, i, j):
     """Calculate change in objective function if you exchange edges from i-th and j-th nodes"""
     n = len(sol)
@@ -47,7 +70,7 @@ def intra_candidate_edge_exchange_delta_next(D, sol, i, j):
     return D[b_next, a_next] + D[a, b] - D[a, a_next] - D[b_next, b]
 
 
-@njit(cache=False)
+@njit(cache=True)
 def inter_node_candidate_edge_exchange_delta_prev(D, sol, i, unselected_nodes, k):
     """Calculate change in objective function if you exchange nodes sol[i] and some node (not in sol)"""
     a = sol[i]
@@ -57,7 +80,7 @@ def inter_node_candidate_edge_exchange_delta_prev(D, sol, i, unselected_nodes, k
     return D[a_prev_prev, node] + D[node, a] - D[a_prev_prev, a_prev] - D[a_prev, a]
 
 
-@njit(cache=False)
+@njit(cache=True)
 def inter_node_candidate_edge_exchange_delta_next(D, sol, i, unselected_nodes, k):
     """Calculate change in objective function if you exchange nodes sol[i] and some node (not in sol)"""
     a = sol[i]
@@ -67,12 +90,12 @@ def inter_node_candidate_edge_exchange_delta_next(D, sol, i, unselected_nodes, k
     return D[a, node] + D[node, a_next_next] - D[a, a_next] - D[a_next, a_next_next]
 
 
-@njit(cache=False)
+@njit(cache=True)
 def intra_node_exchange(sol, i, j):
     sol[i], sol[j] = sol[j], sol[i]
 
 
-@njit(cache=False)
+@njit(cache=True)
 def intra_node_exchange_delta(D, sol, i, j):
     """Calculate change in objective function if you exchange sol[i] and sol[j] nodes"""
     n = len(sol)
@@ -110,62 +133,149 @@ def intra_node_exchange_delta(D, sol, i, j):
     )
 
 
-@njit(cache=False)
-def intra_edge_exchange_2(sol, i, j):
-    sol[i + 1 : j + 1] = np.flip(sol[i + 1 : j + 1])
+@njit(cache=True)
+def reversal_segment(n, i, j):
+    """Exchanging the i-th and j-th edges reverses positions i + 1, ..., j or
+    equivalently the complementary positions j + 1, ..., i (cyclically).
+    Returns: (start, length) of the shorter one, the first one on a tie"""
+    length = (j - i) % n
+    if length <= n - length:
+        return (i + 1) % n, length
+    return (j + 1) % n, n - length
 
 
-@njit()
-def intra_edge_exchange(sol, i, j):
+@njit(cache=True)
+def reverse_segment(sol, start, length):
+    """Reverses length positions of sol beginning at start (cyclically) in place"""
     n = len(sol)
-    if j < i:
-        j += n
+    a, b = start, (start + length - 1) % n
+    for _ in range(length // 2):
+        sol[a], sol[b] = sol[b], sol[a]
+        a = a + 1 if a + 1 < n else 0
+        b = b - 1 if b > 0 else n - 1
 
-    rolled_indices = np.roll(np.arange(n), -i)
 
-    segment_indices = rolled_indices[1 : j - i + 1]
-    sol[segment_indices] = sol[segment_indices][::-1]
+@njit(cache=True)
+def intra_edge_exchange(sol, i, j):
+    """Returns: (start, length) of the reversed positions"""
+    start, length = reversal_segment(len(sol), i, j)
+    reverse_segment(sol, start, length)
+    return start, length
 
 
-@njit(cache=False)
+@njit(cache=True)
 def intra_edge_exchange_delta(D, sol, i, j):
     """Calculate change in objective function if you exchange i-th and j-th edges from sol"""
     n = len(sol)
-    a = sol[i]
-    b = sol[j]
-    a_next = sol[(i + 1) % n]
-    b_next = sol[(j + 1) % n]
-
-    return D[b_next, a_next] + D[a, b] - D[a, a_next] - D[b_next, b]
+    return two_opt_delta(D, sol[i], sol[(i + 1) % n], sol[j], sol[(j + 1) % n])
 
 
-@njit(cache=False)
+@njit(cache=True)
+def intra_edge_exchange_delta_matrix(D, sol):
+    """delta[i, j] = intra_edge_exchange_delta(D, sol, i, j), inf where
+    abs(i - j) < 2. D is read once per entry into G[i, j] = D[sol[i], sol[j]],
+    the deltas are then sums of contiguous rows:
+    delta[i, j] = B[i, j] + G[i, j] - G[i, i + 1] - G[j + 1, j]
+    where B[i, j] = G[j + 1, i + 1] (indices mod n)"""
+    n = len(sol)
+    G = np.empty((n, n))
+    for i in range(n):
+        a = sol[i]
+        for j in range(n):
+            G[i, j] = D[a, sol[j]]
+    B = np.empty((n, n))
+    for j in range(n):
+        for i in range(n):
+            B[i - 1, j - 1] = G[j, i]
+    removed_next = np.empty(n)
+    removed_prev = np.empty(n)
+    for i in range(n):
+        removed_next[i] = G[i, (i + 1) % n]
+        removed_prev[i] = G[(i + 1) % n, i]
+
+    delta = np.empty((n, n))
+    for i in range(n):
+        for j in range(n):
+            delta[i, j] = B[i, j] + G[i, j] - removed_next[i] - removed_prev[j]
+        for j in (i - 1, i, i + 1):
+            delta[i, j % n] = np.inf
+    return delta
+
+
+@njit(cache=True)
+def inter_node_exchange_delta_matrix(D, sol, unselected_nodes):
+    """delta[i, k] = inter_node_exchange_delta(D, sol, i, unselected_nodes, k)"""
+    edges = tour_edge_costs(D, sol)
+    delta = np.empty((len(sol), len(unselected_nodes)))
+    for i in range(len(sol)):
+        inter_node_exchange_delta_row(D, sol, edges, unselected_nodes, i, delta[i])
+    return delta
+
+
+@njit(cache=True)
+def tour_edge_costs(D, sol):
+    """(next, forward, backward) where next[i] = sol[i + 1] (mod n),
+    forward[i] = D[sol[i], next[i]] and backward[i] = D[next[i], sol[i]]"""
+    n = len(sol)
+    following = np.empty(n, dtype=sol.dtype)
+    forward = np.empty(n)
+    backward = np.empty(n)
+    for i in range(n):
+        following[i] = sol[(i + 1) % n]
+        forward[i] = D[sol[i], following[i]]
+        backward[i] = D[following[i], sol[i]]
+    return following, forward, backward
+
+
+@njit(cache=True)
+def intra_edge_exchange_delta_row(D, sol, edges, i, delta):
+    """delta[j] = intra_edge_exchange_delta(D, sol, i, j), inf where
+    abs(i - j) < 2 (cyclically). edges is tour_edge_costs(D, sol), the loop
+    reads two entries of D per move and has no branches"""
+    n = len(sol)
+    following, forward, backward = edges
+    a, a_next = sol[i], following[i]
+    for j in range(n):
+        delta[j] = D[following[j], a_next] + D[a, sol[j]] - forward[i] - backward[j]
+    for j in (i - 1, i, i + 1):
+        delta[j % n] = np.inf
+
+
+@njit(cache=True)
+def inter_node_exchange_delta_row(D, sol, edges, unselected_nodes, i, delta):
+    """delta[k] = inter_node_exchange_delta(D, sol, i, unselected_nodes, k),
+    edges is tour_edge_costs(D, sol)"""
+    following, forward, _ = edges
+    before, after = sol[i - 1], following[i]
+    for k in range(len(unselected_nodes)):
+        new = unselected_nodes[k]
+        delta[k] = D[before, new] + D[new, after] - forward[i - 1] - forward[i]
+
+
+@njit(cache=True)
 def inter_node_exchange(sol, i, unselected_nodes, k):
     sol[i], unselected_nodes[k] = unselected_nodes[k], sol[i]
 
 
-@njit(cache=False)
+@njit(cache=True)
 def inter_node_exchange_delta(D, sol, i, unselected_nodes, k):
     """Calculate change in objective function if you exchange nodes sol[i] and some node (not in sol)"""
-    a = sol[i]
-    a_prev = sol[i - 1]
     a_next = sol[(i + 1) % len(sol)]
-    node = unselected_nodes[k]
-    return D[a_prev, node] + D[node, a_next] - D[a_prev, a] - D[a, a_next]
+    return replace_delta(D, sol[i - 1], sol[i], a_next, unselected_nodes[k])
 
 
-@njit(cache=False)
+@njit(cache=True)
 def apply_move(sol, unselected, best_move):
     move_type, i, j = best_move
-    if move_type == "intra_node":
+    if move_type == INTRA_NODE:
         intra_node_exchange(sol, i, j)
-    elif move_type == "intra_edge":
+    elif move_type == INTRA_EDGE:
         intra_edge_exchange(sol, i, j)
     else:
         inter_node_exchange(sol, i, unselected, j)
 
 
-@njit(cache=False)
+@njit(cache=True)
 def perturb_sol(sol, unselected, intra_move: IntraType, num_continous_nodes_affected):
     i = np.random.randint(0, 100)
     for _ in range(num_continous_nodes_affected):
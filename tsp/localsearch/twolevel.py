@@ -0,0 +1,216 @@
+"""Two-level doubly-linked list
+
+The tour is stored in nodes, cut into segments of consecutive entries. Segment
+s covers nodes[lo[s]], ..., nodes[hi[s]] and is traversed backwards when
+rev[s] is set, order[r] is the segment at rank r and start[s] the tour
+position of its first node. Reversing a path splits at most two segments and
+then reverses the order and the bits of the segments in between. With about
+sqrt(n) segments of about sqrt(n) nodes next, prev and between cost O(1) and
+flip O(sqrt(n)) instead of the O(n) of reversing an array. Splits add
+segments, once there is no room for more the list is rebuilt in O(n).
+
+tour = (nodes, idx, seg_of, lo, hi, rev, order, rank, start, meta) where
+idx[v] is the index of node v in nodes (-1 when v is not in the tour),
+seg_of[v] its segment and meta = [number of segments, segment size].
+"""
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def two_level_list(sol, num_nodes):
+    """Tour visiting sol in order, node ids are below num_nodes"""
+    n = len(sol)
+    size = max(1, int(np.sqrt(n)))
+    capacity = 2 * ((n + size - 1) // size) + 4
+    tour = (
+        np.empty(n, dtype=np.int64),
+        np.full(num_nodes, -1, dtype=np.int64),
+        np.full(num_nodes, -1, dtype=np.int64),
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.int64),
+        np.zeros(capacity, dtype=np.bool_),
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.int64),
+        np.empty(capacity, dtype=np.int64),
+        np.array([0, size], dtype=np.int64),
+    )
+    rebuild(tour, sol)
+    return tour
+
+
+@njit(cache=True)
+def rebuild(tour, ordered):
+    """Stores the nodes of ordered in tour order with segments of equal size"""
+    nodes, idx, seg_of, lo, hi, rev, order, rank, start, meta = tour
+    n = len(nodes)
+    size = meta[1]
+    meta[0] = (n + size - 1) // size
+    for i in range(n):
+        nodes[i] = ordered[i]
+        idx[nodes[i]] = i
+        seg_of[nodes[i]] = i // size
+    for s in range(meta[0]):
+        lo[s] = s * size
+        hi[s] = min(n, (s + 1) * size) - 1
+        rev[s] = False
+        order[s] = s
+        rank[s] = s
+        start[s] = lo[s]
+
+
+@njit(cache=True)
+def first_node(tour, s):
+    nodes, _, _, lo, hi, rev = tour[:6]
+    return nodes[hi[s]] if rev[s] else nodes[lo[s]]
+
+
+@njit(cache=True)
+def last_node(tour, s):
+    nodes, _, _, lo, hi, rev = tour[:6]
+    return nodes[lo[s]] if rev[s] else nodes[hi[s]]
+
+
+@njit(cache=True)
+def in_tour(tour, v):
+    return tour[1][v] != -1
+
+
+@njit(cache=True)
+def tour_position(tour, v):
+    _, idx, seg_of, lo, hi, rev, _, _, start, _ = tour
+    s = seg_of[v]
+    if rev[s]:
+        return start[s] + hi[s] - idx[v]
+    return start[s] + idx[v] - lo[s]
+
+
+@njit(cache=True)
+def tour_next(tour, v):
+    nodes, idx, seg_of, lo, hi, rev, order, rank, _, meta = tour
+    s = seg_of[v]
+    i = idx[v]
+    if rev[s] and i > lo[s]:
+        return nodes[i - 1]
+    if not rev[s] and i < hi[s]:
+        return nodes[i + 1]
+    r = rank[s] + 1
+    return first_node(tour, order[r if r < meta[0] else 0])
+
+
+@njit(cache=True)
+def tour_prev(tour, v):
+    nodes, idx, seg_of, lo, hi, rev, order, rank, _, meta = tour
+    s = seg_of[v]
+    i = idx[v]
+    if rev[s] and i < hi[s]:
+        return nodes[i + 1]
+    if not rev[s] and i > lo[s]:
+        return nodes[i - 1]
+    r = rank[s] - 1
+    return last_node(tour, order[r if r >= 0 else meta[0] - 1])
+
+
+@njit(cache=True)
+def tour_between(tour, a, b, c):
+    """True if b is on the path going forward from a to c"""
+    n = len(tour[0])
+    pa = tour_position(tour, a)
+    return (tour_position(tour, b) - pa) % n <= (tour_position(tour, c) - pa) % n
+
+
+@njit(cache=True)
+def split_before(tour, v):
+    """Makes v the first node of its segment, the smaller part of the split
+    segment moves to a new one"""
+    nodes, idx, seg_of, lo, hi, rev, order, rank, start, meta = tour
+    s = seg_of[v]
+    if first_node(tour, s) == v:
+        return
+    i = idx[v]
+    # storage ranges of the part before v and of the part from v on
+    if rev[s]:
+        head_lo, head_hi, tail_lo, tail_hi = i + 1, hi[s], lo[s], i
+    else:
+        head_lo, head_hi, tail_lo, tail_hi = lo[s], i - 1, i, hi[s]
+    head_size = head_hi - head_lo + 1
+
+    t = meta[0]
+    meta[0] += 1
+    rev[t] = rev[s]
+    if head_size <= tail_hi - tail_lo + 1:
+        lo[t], hi[t] = head_lo, head_hi
+        lo[s], hi[s] = tail_lo, tail_hi
+        start[t] = start[s]
+        start[s] += head_size
+        r = rank[s]
+    else:
+        lo[t], hi[t] = tail_lo, tail_hi
+        lo[s], hi[s] = head_lo, head_hi
+        start[t] = start[s] + head_size
+        r = rank[s] + 1
+    for j in range(lo[t], hi[t] + 1):
+        seg_of[nodes[j]] = t
+    for q in range(meta[0] - 1, r, -1):
+        order[q] = order[q - 1]
+        rank[order[q]] = q
+    order[r] = t
+    rank[t] = r
+
+
+@njit(cache=True)
+def tour_flip(tour, a, b):
+    """Reverses the path going forward from a to b"""
+    nodes, _, seg_of, lo, hi, rev, order, rank, start, meta = tour
+    n = len(nodes)
+    pa, pb = tour_position(tour, a), tour_position(tour, b)
+    if pa > pb:
+        # the path wraps around, reversing the rest gives the same cycle
+        if (pb + 1) % n == pa:
+            return
+        a, b = tour_next(tour, b), tour_prev(tour, a)
+        pa, pb = pb + 1, pa - 1
+    if meta[0] + 2 > len(order):
+        rebuild(tour, tour_to_array(tour))
+    split_before(tour, a)
+    if pb < n - 1:
+        split_before(tour, tour_next(tour, b))
+    r1, r2 = rank[seg_of[a]], rank[seg_of[b]]
+    for q in range((r2 - r1 + 1) // 2):
+        order[r1 + q], order[r2 - q] = order[r2 - q], order[r1 + q]
+    position = pa
+    for r in range(r1, r2 + 1):
+        s = order[r]
+        rank[s] = r
+        rev[s] = not rev[s]
+        start[s] = position
+        position += hi[s] - lo[s] + 1
+
+
+@njit(cache=True)
+def tour_replace(tour, old, new):
+    """Puts node new (not in the tour) in place of old"""
+    nodes, idx, seg_of = tour[:3]
+    i = idx[old]
+    nodes[i] = new
+    idx[new], seg_of[new] = i, seg_of[old]
+    idx[old], seg_of[old] = -1, -1
+
+
+@njit(cache=True)
+def tour_to_array(tour):
+    nodes, _, _, lo, hi, rev, order, _, _, meta = tour
+    result = np.empty(len(nodes), dtype=np.int64)
+    p = 0
+    for r in range(meta[0]):
+        s = order[r]
+        if rev[s]:
+            for i in range(hi[s], lo[s] - 1, -1):
+                result[p] = nodes[i]
+                p += 1
+        else:
+            for i in range(lo[s], hi[s] + 1):
+                result[p] = nodes[i]
+                p += 1
+    return result
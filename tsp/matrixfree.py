@@ -0,0 +1,109 @@
+"""Matrix-free stand-in for the distance matrix
+
+CoordinateMatrix keeps only the points and weights of the instance and
+computes D[i, j] = round(euclidean(i, j)) + weights[j] on demand. It is
+registered as a numba type supporting len(D) and D[i, j], so every kernel
+that only uses scalar indexing of D accepts it in place of the dense matrix."""
+
+import operator
+
+import numpy as np
+from numba import njit, types
+from numba.core import cgutils
+from numba.extending import (
+    NativeValue,
+    make_attribute_wrapper,
+    models,
+    overload,
+    register_model,
+    typeof_impl,
+    unbox,
+)
+
+
+@njit(cache=True)
+def cost(points, weights, i, j):
+    dx = points[i, 0] - points[j, 0]
+    dy = points[i, 1] - points[j, 1]
+    return np.floor(np.sqrt(dx * dx + dy * dy) + 0.5) + weights[j]
+
+
+class CoordinateMatrix:
+    def __init__(self, points, weights):
+        # writable copies if needed (e.g. memory mapped arrays from the cache)
+        self.points = np.require(points, np.float64, ["C", "W"])
+        self.weights = np.require(weights, np.float64, ["C", "W"])
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __getitem__(self, key):
+        i, j = key
+        return cost(self.points, self.weights, i, j)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self), len(self)
+
+
+class CoordinateMatrixType(types.Type):
+    def __init__(self):
+        super().__init__(name="CoordinateMatrix")
+
+
+coordinate_matrix_type = CoordinateMatrixType()
+
+
+@typeof_impl.register(CoordinateMatrix)
+def typeof_coordinate_matrix(val, c):
+    return coordinate_matrix_type
+
+
+@register_model(CoordinateMatrixType)
+class CoordinateMatrixModel(models.StructModel):
+    def __init__(self, dmm, fe_type):
+        members = [
+            ("points", types.float64[:, ::1]),
+            ("weights", types.float64[::1]),
+        ]
+        super().__init__(dmm, fe_type, members)
+
+
+make_attribute_wrapper(CoordinateMatrixType, "points", "points")
+make_attribute_wrapper(CoordinateMatrixType, "weights", "weights")
+
+
+@unbox(CoordinateMatrixType)
+def unbox_coordinate_matrix(typ, obj, c):
+    points_obj = c.pyapi.object_getattr_string(obj, "points")
+    weights_obj = c.pyapi.object_getattr_string(obj, "weights")
+    matrix = cgutils.create_struct_proxy(typ)(c.context, c.builder)
+    matrix.points = c.unbox(types.float64[:, ::1], points_obj).value
+    matrix.weights = c.unbox(types.float64[::1], weights_obj).value
+    c.pyapi.decref(points_obj)
+    c.pyapi.decref(weights_obj)
+    is_error = cgutils.is_not_null(c.builder, c.pyapi.err_occurred())
+    return NativeValue(matrix._getvalue(), is_error=is_error)
+
+
+@overload(len)
+def len_coordinate_matrix(D):
+    if isinstance(D, CoordinateMatrixType):
+        return lambda D: len(D.points)
+
+
+@overload(operator.getitem)
+def getitem_coordinate_matrix(D, key):
+    if not isinstance(D, CoordinateMatrixType):
+        return None
+    if not (
+        isinstance(key, types.BaseTuple)
+        and len(key) == 2
+        and all(isinstance(t, types.Integer) for t in key)
+    ):
+        return None
+
+    def impl(D, key):
+        return cost(D.points, D.weights, key[0], key[1])
+
+    return impl
@@ -0,0 +1,184 @@
+"""Symmetric representation of the problem
+
+Only the strict upper triangle of rounded distances is stored (packed row by
+row in a 1-D array P) together with the node weights, the dense matrix is
+recovered as D[i, j] == distance(P, n, i, j) + weights[j]
+
+PackedMatrix wraps P and the weights like tsp.matrixfree.CoordinateMatrix
+wraps the points: it is a numba type supporting len(D) and D[i, j], so the
+constructors and local searches run on it in place of the dense matrix."""
+
+import operator
+
+import numpy as np
+from numba import njit, types
+from numba.core import cgutils
+from numba.extending import (
+    NativeValue,
+    make_attribute_wrapper,
+    models,
+    overload,
+    register_model,
+    typeof_impl,
+    unbox,
+)
+
+
+def packed_distances(points, dtype=np.float64, block_size=256):
+    """Returns the packed upper triangle of the rounded euclidean distances"""
+    n = len(points)
+    P = np.empty(n * (n - 1) // 2, dtype=dtype)
+    x = points[:, 0]
+    y = points[:, 1]
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        dx = x[start:stop, np.newaxis] - x[np.newaxis, :]
+        dy = y[start:stop, np.newaxis] - y[np.newaxis, :]
+        block = np.floor(np.sqrt(dx * dx + dy * dy) + 0.5)  # mathematical rounding
+        for i in range(start, stop):
+            offset = row_offset(i, n)
+            P[offset : offset + n - i - 1] = block[i - start, i + 1 :]
+    return P
+
+
+@njit(cache=True)
+def row_offset(i, n):
+    """Position of the (i, i + 1) entry in the packed array"""
+    return i * (2 * n - i - 1) // 2
+
+
+@njit(cache=True)
+def distance(P, n, a, b):
+    if a == b:
+        return P.dtype.type(0)
+    if a > b:
+        a, b = b, a
+    return P[row_offset(a, n) + b - a - 1]
+
+
+@njit(cache=True)
+def score(solution, P, weights):
+    n = len(weights)
+    total_cost = 0
+    for i in range(len(solution)):
+        total_cost += distance(P, n, solution[i - 1], solution[i])
+        total_cost += weights[solution[i]]
+    return total_cost
+
+
+@njit(cache=True)
+def intra_edge_exchange_delta(P, weights, sol, i, j):
+    """Calculate change in objective function if you exchange i-th and j-th edges from sol
+    Weights of the nodes do not change, so only distances are needed"""
+    n = len(weights)
+    a = sol[i]
+    b = sol[j]
+    a_next = sol[(i + 1) % len(sol)]
+    b_next = sol[(j + 1) % len(sol)]
+
+    return (
+        distance(P, n, b_next, a_next)
+        + distance(P, n, a, b)
+        - distance(P, n, a, a_next)
+        - distance(P, n, b_next, b)
+    )
+
+
+@njit(cache=True)
+def inter_node_exchange_delta(P, weights, sol, i, unselected_nodes, k):
+    """Calculate change in objective function if you exchange nodes sol[i] and some node (not in sol)"""
+    n = len(weights)
+    a = sol[i]
+    a_prev = sol[i - 1]
+    a_next = sol[(i + 1) % len(sol)]
+    node = unselected_nodes[k]
+    return (
+        distance(P, n, a_prev, node)
+        + distance(P, n, node, a_next)
+        - distance(P, n, a_prev, a)
+        - distance(P, n, a, a_next)
+        + weights[node]
+        - weights[a]
+    )
+
+
+class PackedMatrix:
+    def __init__(self, P, weights):
+        # P is used as is (it may be memory mapped), the weights are small
+        self.P = P
+        self.weights = np.require(weights, np.float64, ["C", "W"])
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def __getitem__(self, key):
+        i, j = key
+        return distance(self.P, len(self.weights), i, j) + self.weights[j]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self), len(self)
+
+
+class PackedMatrixType(types.Type):
+    def __init__(self, P):
+        self.P = P
+        super().__init__(name=f"PackedMatrix({P})")
+
+
+@typeof_impl.register(PackedMatrix)
+def typeof_packed_matrix(val, c):
+    return PackedMatrixType(typeof_impl(val.P, c))
+
+
+@register_model(PackedMatrixType)
+class PackedMatrixModel(models.StructModel):
+    def __init__(self, dmm, fe_type):
+        members = [
+            ("P", fe_type.P),
+            ("weights", types.float64[::1]),
+        ]
+        super().__init__(dmm, fe_type, members)
+
+
+make_attribute_wrapper(PackedMatrixType, "P", "P")
+make_attribute_wrapper(PackedMatrixType, "weights", "weights")
+
+
+@unbox(PackedMatrixType)
+def unbox_packed_matrix(typ, obj, c):
+    P_obj = c.pyapi.object_getattr_string(obj, "P")
+    weights_obj = c.pyapi.object_getattr_string(obj, "weights")
+    matrix = cgutils.create_struct_proxy(typ)(c.context, c.builder)
+    matrix.P = c.unbox(typ.P, P_obj).value
+    matrix.weights = c.unbox(types.float64[::1], weights_obj).value
+    c.pyapi.decref(P_obj)
+    c.pyapi.decref(weights_obj)
+    is_error = cgutils.is_not_null(c.builder, c.pyapi.err_occurred())
+    return NativeValue(matrix._getvalue(), is_error=is_error)
+
+
+@overload(len)
+def len_packed_matrix(D):
+    if isinstance(D, PackedMatrixType):
+        return lambda D: len(D.weights)
+
+
+@overload(operator.getitem)
+def getitem_packed_matrix(D, key):
+    if not isinstance(D, PackedMatrixType):
+        return None
+    if not (
+        isinstance(key, types.BaseTuple)
+        and len(key) == 2
+        and all(isinstance(t, types.Integer) for t in key)
+    ):
+        return None
+
+    def impl(D, key):
+        # a prange index is unsigned, mixed with a signed one distance would
+        # swap them into floats
+        i, j = np.int64(key[0]), np.int64(key[1])
+        return distance(D.P, len(D.weights), i, j) + D.weights[j]
+
+    return impl
@@ -0,0 +1,78 @@
+"""Removing nodes which do not enter good solutions
+
+Every node u of a tour pays its weight and half of the distances to its two
+neighbours, so with d1 <= d2 the two smallest distances from u to other nodes
+    score(tour) >= sum of bound[u] over the tour
+    bound[u] = weights[u] + (d1 + d2) / 2
+(for tours of at least three nodes, where the two neighbours differ). A tour
+containing u therefore scores at least bound[u] plus the solution_size - 1
+smallest bounds of the other nodes.
+If that is above the score of a known solution, no solution at least as good
+contains u and the node can be dropped without losing the optimum.
+
+On the instances the gap between this bound and good solutions is larger
+than the spread of the bounds, so in practice nodes are also dropped by rank:
+keep only a fraction of the nodes with the smallest bounds. This is a
+heuristic, heavily weighted nodes far from everything else go first."""
+
+import numpy as np
+from numba import njit, prange
+
+from tsp.matrixfree import cost
+
+
+@njit(cache=True, parallel=True)
+def insertion_lower_bounds(points, weights):
+    """bound[u] = weights[u] + (d1 + d2) / 2 where d1 <= d2 are the two smallest
+    rounded distances from u to the other nodes, a lower bound of what u adds
+    to tours of at least three nodes. O(n^2) time and O(n) memory"""
+    n = len(points)
+    bound = np.empty(n)
+    for p in prange(n):
+        u = np.int64(p)  # the prange index is unsigned
+        d1, d2 = np.inf, np.inf
+        for v in range(n):
+            if v == u:
+                continue
+            d = cost(points, weights, u, v) - weights[v]
+            if d < d1:
+                d1, d2 = d, d1
+            elif d < d2:
+                d2 = d
+        bound[u] = weights[u] + (d1 + d2) / 2
+    return bound
+
+
+def excluded_nodes(bound, solution_size, upper_bound):
+    """Nodes (as a mask) which are in no solution scoring at most upper_bound"""
+    smallest = np.sort(bound)[:solution_size]
+    # for u outside the solution_size smallest, the cheapest tour through u
+    # replaces the largest of them
+    threshold = upper_bound - smallest.sum() + smallest[-1]
+    return bound > threshold
+
+
+def select_nodes(bound, solution_size, upper_bound=None, keep=None):
+    """Sorted indices of the nodes left after removing the excluded ones (if
+    upper_bound is given) and all but the fraction keep of the nodes with the
+    smallest bounds, at least solution_size nodes are always left
+
+    Raises ValueError if upper_bound excludes so many nodes that no solution
+    scores at most upper_bound, or if fewer than 3 nodes would be left (the
+    bounds only hold for tours of at least three nodes)"""
+    n = len(bound)
+    selected = np.ones(n, dtype=np.bool_)
+    if upper_bound is not None:
+        if solution_size < 3:
+            raise ValueError("the bounds need solutions of at least 3 nodes")
+        selected &= ~excluded_nodes(bound, solution_size, upper_bound)
+        if selected.sum() < solution_size:
+            raise ValueError(f"no solution scores at most {upper_bound}")
+    if keep is not None:
+        if not 0 < keep <= 1:
+            raise ValueError(f"keep must be in (0, 1], got {keep}")
+        count = max(int(np.ceil(keep * n)), solution_size)
+        if count < 3:
+            raise ValueError(f"keep={keep} would leave fewer than 3 nodes")
+        selected[np.argsort(bound, kind="stable")[count:]] = False
+    return np.flatnonzero(selected)
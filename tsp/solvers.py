@@ -1,9 +1,13 @@
-from typing import Protocol
+from typing import Literal, Protocol, get_args
 
 import numpy as np
-from numba import njit
+from numba import njit, prange
 
-from tsp import TSP
+from tsp import TSP, score_many
+
+Constructor = Literal[
+    "nn_first", "nn_any", "greedy_cycle", "regret", "weighted_regret"
+]
 
 
 class Solver(Protocol):
@@ -27,16 +31,58 @@ class RandomSolver(Solver):
         return random_solve(self.problem.D, 0, self.problem.solution_size)
 
 
-@njit()
+@njit(cache=True)
 def random_solve(D, starting, solution_size):
     return np.random.choice(len(D), solution_size, replace=False)
 
 
-@njit()
-def pairwise_circular(lst):
-    for i in range(len(lst) - 1):
-        yield lst[i], lst[i + 1]
-    yield lst[-1], lst[0]
+# Constructors grow the cycle as a linked list: succ[v] is the node after v.
+# label[v] orders the nodes from head (the first node of the returned array),
+# so positions of edges can be compared without keeping an array of the tour.
+LABEL_GAP = 2**32
+
+
+@njit(cache=True)
+def relabel(succ, label, head):
+    node = head
+    i = 0
+    while True:
+        label[node] = i * LABEL_GAP
+        i += 1
+        node = succ[node]
+        if node == head:
+            break
+
+
+@njit(cache=True)
+def link_after(succ, label, head, first, node):
+    """Inserts node between first and its successor in O(1)
+    (amortized, the labels are spread out again once there is no gap left)"""
+    second = succ[first]
+    succ[first] = node
+    succ[node] = second
+    upper = label[first] + 2 * LABEL_GAP if second == head else label[second]
+    if upper - label[first] < 2:
+        relabel(succ, label, head)
+    else:
+        label[node] = (label[first] + upper) // 2
+
+
+@njit(cache=True)
+def link_first(succ, label, node):
+    """Starts a cycle containing only node"""
+    succ[node] = node
+    label[node] = 0
+
+
+@njit(cache=True)
+def linked_to_array(succ, head, size):
+    solution = np.empty(size, dtype=np.int64)
+    node = head
+    for i in range(size):
+        solution[i] = node
+        node = succ[node]
+    return solution
 
 
 class NNHead(Solver):
@@ -46,22 +92,44 @@ class NNHead(Solver):
 
     def solve(self):
         return solve_nn_first(
-            self.problem.D, self.starting_node, self.problem.solution_size
+            self.problem.D,
+            self.starting_node,
+            self.problem.solution_size,
+            self.problem.candidates(),
         )
 
 
-@njit()
-def solve_nn_first(D, starting, sol_size):
-    D = D.copy()
+@njit(cache=True)
+def nearest_unvisited(D, node, visited, closest_nodes=None):
+    """Closest node (by D[node, :], ties by index) that is not visited yet
+
+    closest_nodes are candidate lists ordered the same way (see nearest_neighbors),
+    the first unvisited candidate is then the answer and all nodes are scanned
+    only when every candidate is already visited"""
+    if closest_nodes is not None:
+        for other in closest_nodes[node]:
+            if not visited[other]:
+                return other
+    best_node, best_dist = -1, np.inf
+    for other in range(len(D)):
+        if not visited[other] and D[node, other] < best_dist:
+            best_node, best_dist = other, D[node, other]
+    return best_node
+
+
+@njit(cache=True)
+def solve_nn_first(D, starting, sol_size, closest_nodes=None):
+    visited = np.zeros(len(D), dtype=np.bool_)
+    S = np.empty(sol_size, dtype=np.int64)
     current = starting
-    S = [current]
-    D[:, current] = np.inf
-    for _ in range(sol_size - 1):
-        nn = np.argmin(D[current])
-        S.append(nn)
+    S[0] = current
+    visited[current] = True
+    for s in range(1, sol_size):
+        nn = nearest_unvisited(D, current, visited, closest_nodes)
+        S[s] = nn
         current = nn
-        D[:, current] = np.inf
-    return np.array(S)
+        visited[current] = True
+    return S
 
 
 class NNWhole(Solver):
@@ -71,26 +139,44 @@ class NNWhole(Solver):
 
     def solve(self):
         return solve_nn_any(
-            self.problem.D.copy(), self.starting_node, self.problem.solution_size
+            self.problem.D,
+            self.starting_node,
+            self.problem.solution_size,
+            self.problem.candidates(),
         )
 
 
-@njit()
-def solve_nn_any(D, starting, solution_size):
-    DC = D.copy()
-    solution = [starting]
-    DC[:, starting] = np.inf
+@njit(cache=True)
+def solve_nn_any(D, starting, solution_size, closest_nodes=None):
+    """nearest[v] caches the nearest unvisited node of every node v of the cycle,
+    it is recomputed only after that node gets visited"""
+    n = len(D)
+    visited = np.zeros(n, dtype=np.bool_)
+    succ = np.empty(n, dtype=np.int64)
+    label = np.empty(n, dtype=np.int64)
+    nearest = np.empty(n, dtype=np.int64)
+    link_first(succ, label, starting)
+    visited[starting] = True
+    nearest[starting] = nearest_unvisited(D, starting, visited, closest_nodes)
 
     for _ in range(solution_size - 1):
-        best_i, best_nn, best_delta = -1, -1, np.inf
-        for i, (first, second) in enumerate(pairwise_circular(solution)):
-            nn = np.argmin(DC[first])
-            delta = D[first][nn] + D[nn][second] - D[first][second]
+        best_first, best_nn, best_delta = -1, -1, np.inf
+        first = starting
+        while True:
+            second = succ[first]
+            if visited[nearest[first]]:
+                nearest[first] = nearest_unvisited(D, first, visited, closest_nodes)
+            nn = nearest[first]
+            delta = D[first, nn] + D[nn, second] - D[first, second]
             if delta < best_delta:
-                best_i, best_delta, best_nn = i, delta, nn
-        solution.insert(best_i + 1, best_nn)
-        DC[:, best_nn] = np.inf
-    return np.array(solution)
+                best_first, best_delta, best_nn = first, delta, nn
+            first = second
+            if first == starting:
+                break
+        link_after(succ, label, starting, best_first, best_nn)
+        visited[best_nn] = True
+        nearest[best_nn] = best_nn  # visited, so recomputed when first needed
+    return linked_to_array(succ, starting, solution_size)
 
 
 class GreedyCycle(Solver):
@@ -106,22 +192,82 @@ class GreedyCycle(Solver):
         )
 
 
-@njit()
+@njit(cache=True)
+def insertion_delta(D, first, node, second):
+    return D[first, node] + D[node, second] - D[first, second]
+
+
+@njit(cache=True)
+def cheapest_insertion(D, succ, head, node):
+    """Returns the start node of the cheapest edge to insert node into and the delta,
+    ties are broken by the position of the edge"""
+    best_first, best_delta = -1, np.inf
+    first = head
+    while True:
+        second = succ[first]
+        delta = insertion_delta(D, first, node, second)
+        if delta < best_delta:
+            best_first, best_delta = first, delta
+        first = second
+        if first == head:
+            break
+    return best_first, best_delta
+
+
+@njit(cache=True)
 def solve_greedy_cycle(D, starting, solution_size):
-    solution = [starting]
-    visited = np.zeros(len(D))
-    visited[starting] = 1
+    """Every unvisited node keeps its cheapest insertion edge (identified by the
+    node it starts from) and its delta. After an insertion only the nodes whose
+    edge got removed are rescanned, the rest is compared with the two new edges.
+    Ties are resolved like in a full scan: by delta, edge position and node"""
+    n = len(D)
+    succ = np.empty(n, dtype=np.int64)
+    label = np.empty(n, dtype=np.int64)
+    visited = np.zeros(n, dtype=np.bool_)
+    link_first(succ, label, starting)
+    visited[starting] = True
+
+    best_first = np.full(n, starting, dtype=np.int64)
+    best_delta = np.full(n, np.inf)
+    for node in range(n):
+        if not visited[node]:
+            best_delta[node] = insertion_delta(D, starting, node, starting)
 
     for _ in range(solution_size - 1):
-        best_i, best_node, best_delta = -1, -1, np.inf
-        for i, (first, second) in enumerate(pairwise_circular(solution)):
-            for node in np.where(visited == 0)[0]:
-                delta = D[first, node] + D[node, second] - D[first, second]
-                if delta < best_delta:
-                    best_i, best_node, best_delta = i, node, delta
-        solution.insert(best_i + 1, best_node)
-        visited[best_node] = 1
-    return np.array(solution)
+        best_node = -1
+        for node in range(n):
+            if visited[node]:
+                continue
+            if (
+                best_node == -1
+                or best_delta[node] < best_delta[best_node]
+                or best_delta[node] == best_delta[best_node]
+                and label[best_first[node]] < label[best_first[best_node]]
+            ):
+                best_node = node
+
+        first = best_first[best_node]
+        second = succ[first]
+        link_after(succ, label, starting, first, best_node)
+        visited[best_node] = True
+
+        for node in range(n):
+            if visited[node]:
+                continue
+            if best_first[node] == first:  # its edge does not exist anymore
+                best_first[node], best_delta[node] = cheapest_insertion(
+                    D, succ, starting, node
+                )
+                continue
+            for edge_first, edge_second in ((first, best_node), (best_node, second)):
+                delta = insertion_delta(D, edge_first, node, edge_second)
+                if (
+                    delta < best_delta[node]
+                    or delta == best_delta[node]
+                    and label[edge_first] < label[best_first[node]]
+                ):
+                    best_first[node], best_delta[node] = edge_first, delta
+    return linked_to_array(succ, starting, solution_size)
 
 
 class RegretGreedyCycle(Solver):
@@ -137,29 +283,114 @@ class RegretGreedyCycle(Solver):
         )
 
 
-@njit()
+@njit(cache=True)
 def solve_regret_greedy_cycle(D, starting, solution_size):
-    solution = [starting]
-    visited = np.zeros(len(D))
-    visited[starting] = 1
+    return regret_insertion(D, np.array([starting]), solution_size, False)
 
-    for _ in range(solution_size - 1):
-        best_i, best_node, best_score = -1, -1, np.inf
-        for node in np.where(visited == 0)[0]:
-            bests = []
-            for i, (first, second) in enumerate(pairwise_circular(solution)):
-                delta = D[first, node] + D[node, second] - D[first, second]
-                bests.append((delta, i))
-            if len(bests) == 1:
-                best_node = node
-            else:
-                bests = sorted(bests, key=lambda x: x[0])
-                regret = bests[0][0] - bests[1][0]
-                if regret < best_score:
-                    best_i, best_node, best_score = bests[0][1], node, regret
-        solution.insert(best_i + 1, best_node)
-        visited[best_node] = 1
-    return np.array(solution)
+
+@njit(cache=True)
+def two_cheapest_insertions(D, succ, head, node):
+    """Returns start nodes and deltas of the two cheapest edges to insert node into,
+    ties are broken by the position of the edge"""
+    first1, delta1, first2, delta2 = -1, np.inf, -1, np.inf
+    first = head
+    while True:
+        second = succ[first]
+        delta = insertion_delta(D, first, node, second)
+        if delta < delta1:
+            first1, delta1, first2, delta2 = first, delta, first1, delta1
+        elif delta < delta2:
+            first2, delta2 = first, delta
+        first = second
+        if first == head:
+            break
+    return first1, delta1, first2, delta2
+
+
+@njit(cache=True)
+def regret_insertion(D, starting, solution_size, weighted):
+    """Grows the cycle of starting nodes to solution_size nodes with 2-regret
+    insertion, with weighted the score is 0.5 * regret + 0.5 * cheapest delta
+
+    Every unvisited node keeps its two cheapest insertion edges (identified by
+    their start nodes) and their deltas. After an insertion only the nodes that
+    lost one of them are rescanned, the rest is compared with the two new edges"""
+    n = len(D)
+    succ = np.empty(n, dtype=np.int64)
+    label = np.empty(n, dtype=np.int64)
+    visited = np.zeros(n, dtype=np.bool_)
+    head = starting[0]
+    link_first(succ, label, head)
+    visited[head] = True
+    size = 1
+    for node in starting[1:]:
+        link_after(succ, label, head, starting[size - 1], node)
+        visited[node] = True
+        size += 1
+
+    # with a single edge there is no regret, the last unvisited node is put in front
+    if size == 1 and size < solution_size:
+        last = n - 1
+        while visited[last]:
+            last -= 1
+        link_after(succ, label, head, head, last)
+        label[last] = label[head] - LABEL_GAP
+        head = last
+        visited[last] = True
+        size += 1
+
+    first1 = np.empty(n, dtype=np.int64)
+    delta1 = np.empty(n)
+    first2 = np.empty(n, dtype=np.int64)
+    delta2 = np.empty(n)
+    for node in range(n):
+        if not visited[node]:
+            first1[node], delta1[node], first2[node], delta2[node] = (
+                two_cheapest_insertions(D, succ, head, node)
+            )
+
+    while size < solution_size:
+        best_node, best_score = -1, np.inf
+        for node in range(n):
+            if visited[node]:
+                continue
+            regret = delta1[node] - delta2[node]
+            score = regret
+            if weighted:
+                score = 0.5 * regret + 0.5 * delta1[node]
+            if score < best_score:
+                best_node, best_score = node, score
+
+        first = first1[best_node]
+        second = succ[first]
+        link_after(succ, label, head, first, best_node)
+        visited[best_node] = True
+        size += 1
+
+        for node in range(n):
+            if visited[node]:
+                continue
+            if first1[node] == first or first2[node] == first:
+                first1[node], delta1[node], first2[node], delta2[node] = (
+                    two_cheapest_insertions(D, succ, head, node)
+                )
+                continue
+            for edge_first, edge_second in ((first, best_node), (best_node, second)):
+                delta = insertion_delta(D, edge_first, node, edge_second)
+                if (
+                    delta < delta1[node]
+                    or delta == delta1[node]
+                    and label[edge_first] < label[first1[node]]
+                ):
+                    first2[node], delta2[node] = first1[node], delta1[node]
+                    first1[node], delta1[node] = edge_first, delta
+                elif (
+                    delta < delta2[node]
+                    or delta == delta2[node]
+                    and label[edge_first] < label[first2[node]]
+                ):
+                    first2[node], delta2[node] = edge_first, delta
+    return linked_to_array(succ, head, size)
 
 
 class WeightedRegretGreedyCycle(Solver):
@@ -170,40 +401,51 @@ class WeightedRegretGreedyCycle(Solver):
     def solve(self) -> np.ndarray:
         return solve_weighted_regret_greedy_cycle(
             self.problem.D,
-            self.starting_node,
+            np.array([self.starting_node]),
             self.problem.solution_size,
         )
 
 
 @njit(cache=True)
 def solve_weighted_regret_greedy_cycle(D, starting, solution_size):
-    visited = np.zeros(len(D))
-
-    solution = []
-    for node in starting:
-        solution.append(node)
-
-    for node in solution:
-        visited[node] = 1
-
-    toadd = solution_size - len(solution)
-
-    for _ in range(toadd):
-        best_i, best_node, best_score = -1, -1, np.inf
-        for node in np.where(visited == 0)[0]:
-            bests = []
-            for i, (first, second) in enumerate(pairwise_circular(solution)):
-                delta = D[first, node] + D[node, second] - D[first, second]
-                bests.append((delta, i))
-            if len(bests) == 1:
-                best_node = node
-            else:
-                bests = sorted(bests, key=lambda x: x[0])
-                regret = bests[0][0] - bests[1][0]
-                curr_delta = bests[0][0]
-                score = 0.5 * regret + 0.5 * curr_delta
-                if score < best_score:
-                    best_i, best_node, best_score = bests[0][1], node, score
-        solution.insert(best_i + 1, best_node)
-        visited[best_node] = 1
-    return np.array(solution)
+    nodes = np.empty(len(starting), dtype=np.int64)
+    for i, node in enumerate(starting):
+        nodes[i] = node
+    return regret_insertion(D, nodes, solution_size, True)
+
+
+def solve_all_starts(
+    problem: TSP, constructor: Constructor, starts=None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Runs the constructor from every node (or from the given start nodes) in
+    parallel, returns the tours as rows of a 2-D array and their scores"""
+    if starts is None:
+        starts = np.arange(len(problem))
+    tours = construct_from_starts(
+        problem.D,
+        np.asarray(starts, dtype=np.int64),
+        problem.solution_size,
+        get_args(Constructor).index(constructor),
+        problem.candidates(),
+    )
+    return tours, score_many(tours, problem.D)
+
+
+@njit(cache=True, parallel=True)
+def construct_from_starts(D, starts, solution_size, constructor, closest_nodes):
+    """constructor is the index of the method in Constructor"""
+    tours = np.empty((len(starts), solution_size), dtype=np.int64)
+    for s in prange(len(starts)):
+        if constructor == 0:
+            tours[s] = solve_nn_first(D, starts[s], solution_size, closest_nodes)
+        elif constructor == 1:
+            tours[s] = solve_nn_any(D, starts[s], solution_size, closest_nodes)
+        elif constructor == 2:
+            tours[s] = solve_greedy_cycle(D, starts[s], solution_size)
+        elif constructor == 3:
+            tours[s] = solve_regret_greedy_cycle(D, starts[s], solution_size)
+        else:
+            tours[s] = solve_weighted_regret_greedy_cycle(
+                D, starts[s : s + 1], solution_size
+            )
+    return tours
@@ -15,7 +15,7 @@ def random_starting(
     return selected, unselected
 
 
-@njit()
+@njit(cache=True)
 def random_starting_from_starting(
     n, sol_size, starting
 ) -> tuple[np.ndarray, np.ndarray]:
@@ -25,3 +25,12 @@ def random_starting_from_starting(
     selected = points[:sol_size]
     unselected = points[sol_size:]
     return selected, unselected
+
+
+def random_instance(n, seed=0) -> tuple[np.ndarray, np.ndarray]:
+    """Points and weights of a synthetic instance of n nodes for the
+    benchmarks, coordinates in [0, 4000) and weights in [100, 2000)"""
+    rng = np.random.default_rng(seed)
+    points = rng.integers(0, 4000, size=(n, 2)).astype(np.float64)
+    weights = rng.integers(100, 2000, size=n).astype(np.float64)
+    return points, weights